@@ -0,0 +1,202 @@
+# importing modules
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from settings import *
+from rotation_cache import RotationCache
+
+# file layout: header, json index of where every image and frame sits, then the atlas pixels as raw rgba
+ATLAS_MAGIC = b"ATL1"
+ATLAS_VERSION = 1
+HEADER = struct.Struct("<4sH20sIII")
+
+# images in the atlas as name: (file, scale), read when called so changed settings take effect
+def asset_specs():
+    return {
+        "player": ("player/survivorrifle.png", PLAYER_SIZE),
+        "bullet": ("bullets/boolettrail.png", 1),
+        "enemy": ("enemy.png", ENEMY_SIZE),
+        "enemy_dead": ("enemy_dead.png", ENEMY_DEAD_SIZE),
+        "drop_gun": ("enemy_gun.png", DROP_WEAPON_SIZE),
+        "crosshair": ("crosshair.png", CROSSHAIR_SIZE),
+        "kill_indicator": ("kill_indicator.png", KILL_INDICATOR_SIZE),
+    }
+
+# how the rotation cache turns each image that rotates, as name: (scale, smooth)
+# bullets are scaled while they are rotated, which keeps their frames as sharp as before
+def rotation_specs():
+    return {
+        "player": (1, False),
+        "enemy": (1, False),
+        "enemy_dead": (1, False),
+        "bullet": (BULLET_SIZE, True),
+    }
+
+# sha1 of everything the atlas is built from, any change to a source file, a scale or a rotation scale builds it again
+def atlas_key(specs, rotated):
+    rotations = rotation_specs()
+    digest = hashlib.sha1()
+    digest.update(json.dumps([specs, {name: rotations[name] for name in rotated}, ROTATION_STEP, ASSET_ATLAS_WIDTH, pygame.version.ver], sort_keys=True).encode("utf-8"))
+    for path, scale in specs.values():
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.digest()
+
+# decode and scale one image, runs on a worker thread
+def decode(path, scale):
+    image = pygame.image.load(path).convert_alpha()
+    if scale != 1:
+        image = pygame.transform.rotozoom(image, 0, scale)
+    return image
+
+# render every rotation frame of an image the same way the rotation cache does, runs on a worker thread
+def rotate_frames(name, image, scale, smooth):
+    cache = RotationCache(ROTATION_STEP)
+    cache.add(name, image, scale, smooth)
+    return [cache.render(name, index) for index in range(cache.frame_count)]
+
+# place rectangles of the given sizes on shelves, tallest first, returns the rects and the atlas size
+def pack(sizes, max_width=ASSET_ATLAS_WIDTH):
+    rects = [None] * len(sizes)
+    x = y = shelf_height = width = 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i]
+        if x + w > max_width and x > 0:
+            y += shelf_height
+            x = shelf_height = 0
+        rects[i] = pygame.Rect(x, y, w, h)
+        x += w
+        width = max(width, x)
+        shelf_height = max(shelf_height, h)
+    return rects, (max(width, 1), max(y + shelf_height, 1))
+
+# every scaled image and pre-rotated frame packed into one surface, handed out as subsurfaces
+class AssetAtlas:
+    def __init__(self, surface, image_rects, frame_rects, key, build_time=0.0, from_cache=False):
+        self.surface = surface
+        self.image_rects = image_rects
+        self.frame_rects = frame_rects
+        self.key = key
+        self.build_time = build_time
+        self.from_cache = from_cache
+        self.images = {name: surface.subsurface(rect) for name, rect in image_rects.items()}
+        self.frames = {name: [surface.subsurface(rect) for rect in rects] for name, rects in frame_rects.items()}
+
+    # describe where the atlas came from and its size
+    def report(self):
+        width, height = self.surface.get_size()
+        return "asset atlas: {} images, {} frames, {}x{} ({:.1f} MiB), {} in {:.0f} ms".format(
+            len(self.images), sum(len(frames) for frames in self.frames.values()), width, height, width * height * 4 / (1024 * 1024),
+            "loaded" if self.from_cache else "built", self.build_time * 1000)
+
+    # decode and scale the source images on a thread pool and pack them with their pre-rotated frames
+    @classmethod
+    def build(cls, specs, rotated, key, threads=ASSET_DECODE_THREADS):
+        start = time.perf_counter()
+        rotations = rotation_specs()
+        with ThreadPoolExecutor(threads) as executor:
+            decoded = {name: executor.submit(decode, path, scale) for name, (path, scale) in specs.items()}
+            images = {name: future.result() for name, future in decoded.items()}
+            rendered = {name: executor.submit(rotate_frames, name, images[name], *rotations[name]) for name in rotated}
+            frames = {name: future.result() for name, future in rendered.items()}
+
+        names = list(images)
+        surfaces = [images[name] for name in names]
+        for name in rotated:
+            surfaces += frames[name]
+        rects, size = pack([surface.get_size() for surface in surfaces])
+
+        # a max blend onto the cleared atlas copies pixels and alpha exactly
+        atlas = pygame.Surface(size, pygame.SRCALPHA, 32)
+        for surface, rect in zip(surfaces, rects):
+            atlas.blit(surface, rect, special_flags=pygame.BLEND_RGBA_MAX)
+
+        image_rects = dict(zip(names, rects))
+        frame_rects = {}
+        offset = len(names)
+        for name in rotated:
+            frame_rects[name] = rects[offset:offset + len(frames[name])]
+            offset += len(frames[name])
+        return cls(atlas, image_rects, frame_rects, key, time.perf_counter() - start)
+
+    # write the atlas as raw pixels, through a temporary file so other processes never read half of it
+    def save(self, path):
+        index = json.dumps({"images": {name: list(rect) for name, rect in self.image_rects.items()},
+                            "frames": {name: [list(rect) for rect in rects] for name, rects in self.frame_rects.items()}}).encode("utf-8")
+        width, height = self.surface.get_size()
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary_path, "wb") as f:
+            f.write(HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, self.key, width, height, len(index)))
+            f.write(index)
+            f.write(pygame.image.tobytes(self.surface, "RGBA"))
+        os.replace(temporary_path, path)
+
+    # read a cached atlas, returns None if it is missing or was built from different sources
+    @classmethod
+    def load(cls, path, key):
+        start = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, stored_key, width, height, index_size = HEADER.unpack_from(data)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION or stored_key != key:
+            return None
+
+        offset = HEADER.size + index_size
+        index = json.loads(data[HEADER.size:offset])
+        surface = pygame.image.frombuffer(data[offset:], (width, height), "RGBA")
+        surface = surface.convert_alpha() if pygame.display.get_surface() is not None else surface.copy()
+        image_rects = {name: pygame.Rect(rect) for name, rect in index["images"].items()}
+        frame_rects = {name: [pygame.Rect(rect) for rect in rects] for name, rects in index["frames"].items()}
+        return cls(surface, image_rects, frame_rects, key, time.perf_counter() - start, from_cache=True)
+
+# the atlas shared by every game in this process
+loaded_atlas = None
+
+# return the atlas, loading it from the cache or building and caching it when the sources or settings changed
+# a display mode must be set first
+def load_atlas(path=ASSET_CACHE_PATH, rebuild=False):
+    global loaded_atlas
+    specs = asset_specs()
+    rotated = [name for name in ASSET_ATLAS_ROTATIONS if name in rotation_specs()]
+    key = atlas_key(specs, rotated)
+    if loaded_atlas is not None and loaded_atlas.key == key and not rebuild:
+        return loaded_atlas
+
+    atlas = None if rebuild else AssetAtlas.load(path, key)
+    if atlas is None:
+        atlas = AssetAtlas.build(specs, rotated, key)
+        try:
+            atlas.save(path)
+        except OSError:
+            pass
+    loaded_atlas = atlas
+    return atlas
+
+# build the atlas and time a cold build against a warm load from the command line
+def main():
+    parser = argparse.ArgumentParser(description="build the sprite atlas cache")
+    parser.add_argument("--path", default=ASSET_CACHE_PATH)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    print(load_atlas(args.path, rebuild=True).report())
+
+    global loaded_atlas
+    loaded_atlas = None
+    print(load_atlas(args.path).report())
+
+if __name__ == "__main__":
+    sys.exit(main())
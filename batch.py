@@ -0,0 +1,235 @@
+# importing modules
+import os
+import sys
+import ast
+import json
+import time
+import random
+import argparse
+import itertools
+import statistics
+from multiprocessing import Pool, cpu_count
+import settings
+from settings import *
+from engine import Game, PlayerInput, init_headless
+from flow_field import FlowField
+
+# settings as they were before any overrides, filled in the first time one is applied
+DEFAULT_SETTINGS = {}
+
+# settings.py works these out from other settings when it is imported, so they are worked out again from the applied values
+DERIVED_SETTINGS = {
+    "PLAYERSTART_X": lambda value: value("SCREEN_WIDTH") // 4,
+    "PLAYERSTART_Y": lambda value: value("SCREEN_WIDTH") // 4,
+    "BULLET_LIFETIME_TICKS": lambda value: value("BULLET_LIFETIME") * value("TICK_RATE") // 1000,
+}
+
+# set settings in every loaded game module, anything not overridden goes back to its default
+# derived settings follow the settings they come from and cannot be set themselves
+def apply_settings(overrides):
+    unknown = [name for name in overrides if not hasattr(settings, name)]
+    if unknown:
+        raise ValueError("unknown settings: {}".format(", ".join(unknown)))
+    derived = [name for name in overrides if name in DERIVED_SETTINGS]
+    if derived:
+        raise ValueError("derived settings cannot be set: {}".format(", ".join(derived)))
+
+    # the value a setting takes with these overrides
+    def value(name):
+        return overrides[name] if name in overrides else DEFAULT_SETTINGS.get(name, getattr(settings, name))
+
+    values = {name: value(name) for name in set(DEFAULT_SETTINGS) | set(overrides)}
+    values.update((name, derive(value)) for name, derive in DERIVED_SETTINGS.items())
+    for name, new_value in values.items():
+        DEFAULT_SETTINGS.setdefault(name, getattr(settings, name))
+        for module in list(sys.modules.values()):
+            if getattr(module, "__file__", None) and os.path.dirname(os.path.abspath(module.__file__)) == os.path.dirname(os.path.abspath(__file__)) and hasattr(module, name):
+                setattr(module, name, new_value)
+
+# holds a random direction for a while, aims anywhere and fires in bursts
+class RandomPolicy:
+    def __init__(self, game, seed):
+        self.rng = random.Random(seed)
+        self.player_input = PlayerInput()
+        self.hold_ticks = 0
+
+    def __call__(self, game):
+        if self.hold_ticks <= 0:
+            self.hold_ticks = self.rng.randint(10, 60)
+            self.player_input = PlayerInput(*(self.rng.random() < 0.3 for _ in range(4)), shoot=self.rng.random() < 0.5,
+                                            mouse_pos=(self.rng.randint(0, SCREEN_WIDTH), self.rng.randint(0, SCREEN_HEIGHT)))
+        self.hold_ticks -= 1
+        return self.player_input
+
+# walks towards the nearest enemy along the map, shoots any enemy in sight and heads for the exit once they are all dead
+class HunterPolicy:
+    def __init__(self, game, seed):
+        self.path = FlowField(game.tile_map)
+
+    def __call__(self, game):
+        player = game.player
+        enemies = game.enemies.sprites()
+        player_input = PlayerInput()
+
+        if enemies:
+            nearest = min(enemies, key=lambda enemy: (enemy.pos - player.pos).length_squared())
+            target = nearest.pos
+            visible = [enemy for enemy in enemies if enemy.can_see_player]
+            if visible:
+                player_input.aim_at(player, min(visible, key=lambda enemy: (enemy.pos - player.pos).length_squared()).rect.center)
+                player_input.shoot = True
+            else:
+                player_input.aim_at(player, target)
+        else:
+            exit_x, exit_y = game.tile_map.exit_tile_location
+            target = (exit_x + TILE_SIZE / 2, exit_y + TILE_SIZE / 2)
+            player_input.aim_at(player, target)
+
+        # the path is a flow field towards the target, so it points the way from the player's tile
+        self.path.update(target)
+        direction_x, direction_y = self.path.direction_at(player.pos)
+        player_input.right = direction_x > 0.38
+        player_input.left = direction_x < -0.38
+        player_input.down = direction_y > 0.38
+        player_input.up = direction_y < -0.38
+        return player_input
+
+# policies by name
+POLICIES = {
+    "hunter": HunterPolicy,
+    "random": RandomPolicy,
+}
+
+# the game a worker reuses while the settings it was built with stay the same
+worker_game = None
+worker_game_key = None
+
+# start pygame once in each worker
+def init_worker():
+    init_headless()
+
+# play one game to the end and describe how it went
+def simulate(job):
+    global worker_game, worker_game_key
+    apply_settings(job["overrides"])
+    key = (job["map"], tuple(sorted(job["overrides"].items())))
+    if key != worker_game_key:
+        worker_game = Game(job["map"])
+        worker_game_key = key
+    game = worker_game
+
+    game.new_game(job["seed"])
+    policy = POLICIES[job["policy"]](game, job["seed"])
+    enemy_count = len(game.enemies)
+    ticks = game.run(job["max_ticks"], policy)
+
+    if game.is_complete():
+        outcome = "clear"
+    elif not game.player.alive():
+        outcome = "death"
+    else:
+        outcome = "timeout"
+    killer = game.killed_by.spawn_location if game.killed_by is not None else None
+    return {
+        "id": job["id"],
+        "config": job["config"],
+        "overrides": job["overrides"],
+        "policy": job["policy"],
+        "seed": job["seed"],
+        "outcome": outcome,
+        "ticks": ticks,
+        "time_to_clear": game.elapsed_time / 1000 if outcome == "clear" else None,
+        "ammo_used": game.player.shots_fired,
+        "kills": enemy_count - len(game.enemies),
+        "enemies": enemy_count,
+        "killed_by": list(killer) if killer is not None else None,
+    }
+
+# every combination of the swept settings, each value list comes from one --set option
+def settings_grid(sweeps):
+    names = list(sweeps)
+    return [dict(zip(names, values)) for values in itertools.product(*(sweeps[name] for name in names))]
+
+# jobs for a number of runs of each settings combination, seeds follow on from the base seed
+def make_jobs(configs, runs, policy, map_filename=MAP_FILENAME, seed=0, max_ticks=BATCH_MAX_TICKS):
+    return [{"id": config_index * runs + run, "config": config_index, "overrides": overrides, "policy": policy, "map": map_filename,
+             "seed": seed + config_index * runs + run, "max_ticks": max_ticks}
+            for config_index, overrides in enumerate(configs) for run in range(runs)]
+
+# run jobs on every core, writing each result as a json line the moment it arrives
+def run_batch(jobs, output_path, processes=None):
+    results = []
+    start = time.perf_counter()
+    with open(output_path, "w") as output, Pool(processes or cpu_count(), initializer=init_worker) as pool:
+        for result in pool.imap_unordered(simulate, jobs, chunksize=max(1, min(16, len(jobs) // (4 * (processes or cpu_count()))))):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            results.append(result)
+
+        # let the workers exit on their own, pygame in a worker can swallow the terminate signal
+        pool.close()
+        pool.join()
+    return results, time.perf_counter() - start
+
+# outcome totals for one settings combination
+def summarise(results):
+    runs = len(results)
+    clears = [result for result in results if result["outcome"] == "clear"]
+    deaths_by_enemy = {}
+    for result in results:
+        if result["killed_by"] is not None:
+            key = "{},{}".format(*result["killed_by"])
+            deaths_by_enemy[key] = deaths_by_enemy.get(key, 0) + 1
+    return {
+        "overrides": results[0]["overrides"],
+        "runs": runs,
+        "clear_rate": len(clears) / runs,
+        "death_rate": sum(result["outcome"] == "death" for result in results) / runs,
+        "timeout_rate": sum(result["outcome"] == "timeout" for result in results) / runs,
+        "median_time_to_clear": statistics.median(result["time_to_clear"] for result in clears) if clears else None,
+        "mean_ammo_used": statistics.mean(result["ammo_used"] for result in results),
+        "mean_kills": statistics.mean(result["kills"] for result in results),
+        "deaths_by_enemy": dict(sorted(deaths_by_enemy.items(), key=lambda item: -item[1])),
+    }
+
+# run a settings sweep from the command line
+def main():
+    parser = argparse.ArgumentParser(description="run many headless games in parallel")
+    parser.add_argument("--runs", type=int, default=BATCH_RUNS, help="games for each settings combination")
+    parser.add_argument("--policy", choices=list(POLICIES), default="hunter")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE[,VALUE...]", help="setting to override, several values are swept")
+    parser.add_argument("--map", default=MAP_FILENAME)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=BATCH_MAX_TICKS)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default=BATCH_OUTPUT, help="json lines file the results stream to")
+    args = parser.parse_args()
+
+    sweeps = {}
+    for option in args.set:
+        name, _, values = option.partition("=")
+        sweeps[name.strip()] = [ast.literal_eval(value.strip()) for value in values.split(",")]
+    configs = settings_grid(sweeps)
+
+    # check the setting names before starting the workers
+    apply_settings(configs[0])
+
+    jobs = make_jobs(configs, args.runs, args.policy, args.map, args.seed, args.max_ticks)
+    results, elapsed = run_batch(jobs, args.output, args.processes)
+    ticks = sum(result["ticks"] for result in results)
+    print("{} games, {} ticks in {:.1f}s ({:.1f} games/s, {:.0f} ticks/s)".format(len(results), ticks, elapsed, len(results) / elapsed, ticks / elapsed))
+
+    summaries = [summarise([result for result in results if result["config"] == index]) for index in range(len(configs))]
+    for summary in summaries:
+        time_to_clear = "{:.1f}s".format(summary["median_time_to_clear"]) if summary["median_time_to_clear"] is not None else "-"
+        print("{}: clear {:.0%}, death {:.0%}, timeout {:.0%}, median clear {}, ammo {:.1f}, kills {:.1f}".format(
+            summary["overrides"] or "defaults", summary["clear_rate"], summary["death_rate"], summary["timeout_rate"],
+            time_to_clear, summary["mean_ammo_used"], summary["mean_kills"]))
+
+    summary_path = os.path.splitext(args.output)[0] + "_summary.json"
+    with open(summary_path, "w") as f:
+        json.dump(summaries, f, indent=2)
+    print("results in", args.output, "and", summary_path)
+
+if __name__ == "__main__":
+    main()
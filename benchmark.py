@@ -0,0 +1,268 @@
+# importing modules
+import os
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import platform
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import pygame
+from settings import *
+from engine import Game, PlayerInput, init_headless
+from streamed_map import generate_open_map
+
+# peak memory is read from the operating system where it is available
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# write a generated map, unchanged maps are left alone so their visibility index stays cached
+def write_map(map_dir, name, rows):
+    os.makedirs(map_dir, exist_ok=True)
+    path = os.path.join(map_dir, name)
+    content = "\n".join("".join(row) for row in rows) + "\n"
+    if not os.path.exists(path) or open(path).read() != content:
+        with open(path, "w") as f:
+            f.write(content)
+    return path
+
+# open square room with the player in the middle and enemies on random floor tiles
+def arena_rows(size, enemy_count, seed):
+    rows = [["#"] * size] + [["#"] + [" "] * (size - 2) + ["#"] for _ in range(size - 2)] + [["#"] * size]
+    centre = size // 2
+    rows[centre][centre] = "P"
+    floor = [(x, y) for y in range(1, size - 1) for x in range(1, size - 1) if (x, y) != (centre, centre)]
+    for x, y in random.Random(seed).sample(floor, enemy_count):
+        rows[y][x] = "E"
+    rows[-1][-2] = "X"
+    return rows
+
+# depth first maze with corridors one tile wide, enemies on random corridor tiles
+def maze_rows(size, enemy_count, seed):
+    rng = random.Random(seed)
+    rows = [["#"] * size for _ in range(size)]
+    cells = (size - 1) // 2
+    stack = [(0, 0)]
+    rows[1][1] = " "
+    while stack:
+        x, y = stack[-1]
+        neighbours = [(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)) if 0 <= x + dx < cells and 0 <= y + dy < cells and rows[2 * (y + dy) + 1][2 * (x + dx) + 1] == "#"]
+        if not neighbours:
+            stack.pop()
+            continue
+        nx, ny = rng.choice(neighbours)
+        rows[y + ny + 1][x + nx + 1] = " "
+        rows[2 * ny + 1][2 * nx + 1] = " "
+        stack.append((nx, ny))
+
+    floor = [(x, y) for y in range(size) for x in range(size) if rows[y][x] == " " and (x, y) != (1, 1)]
+    for x, y in rng.sample(floor, enemy_count):
+        rows[y][x] = "E"
+    rows[1][1] = "P"
+    rows[-1][-2] = "X"
+    return rows
+
+# walk in a slow square while shooting at the nearest enemy
+def scripted_input(game):
+    tick = game.tick_count - game.start_tick
+    player_input = PlayerInput(right=tick % 240 < 60, down=60 <= tick % 240 < 120, left=120 <= tick % 240 < 180, up=tick % 240 >= 180, shoot=True)
+    enemies = game.enemies.sprites()
+    if enemies and game.player.alive():
+        player_input.aim_at(game.player, min(enemies, key=lambda enemy: (enemy.pos - game.player.pos).length_squared()).pos)
+    else:
+        angle = tick / 20
+        player_input.mouse_pos = (SCREEN_WIDTH // 2 + 400 * math.cos(angle), SCREEN_HEIGHT // 2 + 400 * math.sin(angle))
+    return player_input
+
+# number of live bullets in either bullet system
+def bullet_count(game):
+    if game.bullet_engine:
+        return game.bullet_engine.count
+    return len(game.bullets)
+
+# the stock map played by the scripted player
+def stock_scenario(map_dir):
+    return MAP_FILENAME, None, scripted_input
+
+# a 400 by 400 maze, too large for the visibility index so sight uses rays
+def maze_scenario(map_dir):
+    return write_map(map_dir, "maze400.txt", maze_rows(400, 300, 1)), None, scripted_input
+
+# 1000 enemies in an open arena, all with line of sight to the player
+def enemies_scenario(map_dir):
+    return write_map(map_dir, "arena_enemies.txt", arena_rows(48, 1000, 2)), None, scripted_input
+
+# 5000 live bullets flying around an empty arena, topped up every tick
+def bullets_scenario(map_dir):
+    rng = random.Random(3)
+    size = 48
+
+    def drive(game):
+        for _ in range(5000 - bullet_count(game)):
+            game.spawn_bullet(rng.uniform(TILE_SIZE, (size - 1) * TILE_SIZE), rng.uniform(TILE_SIZE, (size - 1) * TILE_SIZE), rng.uniform(0, 360), "player")
+        return scripted_input(game)
+
+    return write_map(map_dir, "arena_bullets.txt", arena_rows(size, 0, 3)), None, drive
+
+# an arena full of corpses and dropped weapons
+def corpses_scenario(map_dir):
+    def prepare(game):
+        for enemy in game.enemies.sprites():
+            enemy.die()
+
+    return write_map(map_dir, "arena_corpses.txt", arena_rows(48, 800, 4)), prepare, scripted_input
+
+# a 10000 by 10000 open level streamed from a memory mapped file, peak memory should stay near the other scenarios
+def open_scenario(map_dir):
+    path = os.path.join(map_dir, "open10k" + STREAMED_MAP_SUFFIX)
+    if not os.path.exists(path):
+        os.makedirs(map_dir, exist_ok=True)
+        generate_open_map(path, 10000, 50, 5)
+    return path, None, scripted_input
+
+# scenarios by name, in the order they run
+SCENARIOS = {
+    "stock": stock_scenario,
+    "maze400": maze_scenario,
+    "enemies1000": enemies_scenario,
+    "bullets5000": bullets_scenario,
+    "corpses": corpses_scenario,
+    "open10k": open_scenario,
+}
+
+# run one scenario and measure every frame, rendering into an offscreen surface unless render is off
+def run_scenario(name, ticks=BENCHMARK_TICKS, render=True, map_dir=BENCHMARK_MAP_DIR):
+    init_headless()
+    map_filename, prepare, drive = SCENARIOS[name](map_dir)
+    game = Game(map_filename, seed=BENCHMARK_SEED)
+    if prepare:
+        prepare(game)
+
+    if render:
+        import project
+        surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        camera = project.Camera(game.tile_map)
+
+    frame_times = []
+    start = time.perf_counter()
+    for _ in range(ticks):
+        frame_start = time.perf_counter()
+        game.step(drive(game))
+        if render:
+            surface.fill(BLACK)
+            project.draw_world(surface, camera, game)
+        frame_times.append(time.perf_counter() - frame_start)
+    total_time = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(frame_times, n=100)
+    peak_memory = None
+    if resource is not None:
+        # kilobytes on linux, bytes on macos
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    return {
+        "ticks": ticks,
+        "ticks_per_second": ticks / total_time,
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "peak_memory_mb": peak_memory / (1024 * 1024) if peak_memory is not None else None,
+        "enemies_left": len(game.enemies),
+        "bullets_left": bullet_count(game),
+        "bullet_pool": game.bullet_pool.stats(),
+        "drop_pool": game.drop_pool.stats(),
+    }
+
+# run scenarios, each in a fresh process so peak memory and caches are not shared
+def run_suite(names, ticks=BENCHMARK_TICKS, render=True):
+    results = {}
+    for name in names:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            results[name] = executor.submit(run_scenario, name, ticks, render).result()
+        print(format_result(name, results[name]))
+    return results
+
+# one line summary of a scenario result
+def format_result(name, result):
+    memory = "{:.0f} MiB".format(result["peak_memory_mb"]) if result["peak_memory_mb"] is not None else "n/a"
+    return "{:<12} {:>8.0f} ticks/s  p50 {:6.2f} ms  p95 {:6.2f} ms  p99 {:6.2f} ms  peak {}".format(
+        name, result["ticks_per_second"], result["p50_ms"], result["p95_ms"], result["p99_ms"], memory)
+
+# list regressions against a baseline, thresholds are allowed fractional changes for each metric
+def compare(results, baseline, thresholds):
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["ticks_per_second"] < old["ticks_per_second"] * (1 - thresholds["ticks_per_second"]):
+            regressions.append("{}: ticks/s {:.0f} -> {:.0f}".format(name, old["ticks_per_second"], result["ticks_per_second"]))
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_memory_mb"):
+            if result[metric] is not None and old.get(metric) is not None and result[metric] > old[metric] * (1 + thresholds[metric]):
+                regressions.append("{}: {} {:.2f} -> {:.2f}".format(name, metric, old[metric], result[metric]))
+    return regressions
+
+# run the benchmark suite from the command line
+def main():
+    parser = argparse.ArgumentParser(description="run headless benchmark scenarios")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run, all of them by default: {}".format(", ".join(SCENARIOS)))
+    parser.add_argument("--ticks", type=int, default=BENCHMARK_TICKS)
+    parser.add_argument("--no-render", action="store_true", help="only time the simulation")
+    parser.add_argument("--output", default=BENCHMARK_OUTPUT, help="where to write the results as JSON")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_THRESHOLD, help="allowed fractional regression for every metric")
+    parser.add_argument("--tps-threshold", type=float, help="allowed fractional drop in ticks per second")
+    parser.add_argument("--frame-threshold", type=float, help="allowed fractional rise in frame time percentiles")
+    parser.add_argument("--memory-threshold", type=float, help="allowed fractional rise in peak memory")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenario: {}".format(", ".join(unknown)))
+    results = run_suite(names, args.ticks, not args.no_render)
+    report = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "ticks": args.ticks,
+        "render": not args.no_render,
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print("baseline saved to", args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    frame_threshold = args.frame_threshold if args.frame_threshold is not None else args.threshold
+    thresholds = {
+        "ticks_per_second": args.tps_threshold if args.tps_threshold is not None else args.threshold,
+        "p50_ms": frame_threshold,
+        "p95_ms": frame_threshold,
+        "p99_ms": frame_threshold,
+        "peak_memory_mb": args.memory_threshold if args.memory_threshold is not None else args.threshold,
+    }
+    regressions = compare(results, baseline["scenarios"], thresholds)
+    for regression in regressions:
+        print("regression:", regression)
+    if not regressions:
+        print("no regressions against", args.baseline)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
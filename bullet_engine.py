@@ -0,0 +1,183 @@
+# importing modules
+from settings import *
+from sweep import segment_box_times
+
+# numpy is optional, the sprite based bullets are used without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BULLET_SOURCE_PLAYER = 0
+BULLET_SOURCE_ENEMY = 1
+
+# struct of arrays bullet system, every live bullet is a row in preallocated arrays
+class BulletEngine:
+    def __init__(self, tile_map, rotation_cache, capacity=BULLET_ENGINE_CAPACITY, seed=None):
+        if np is None:
+            raise RuntimeError("BulletEngine requires numpy")
+
+        self.capacity = capacity
+        self.count = 0
+        self.dropped = 0
+
+        # live bullets are packed into the first self.count rows
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.theta = np.zeros(capacity, dtype=np.float64)
+        self.spawn_tick = np.zeros(capacity, dtype=np.int64)
+        self.source = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # who fired each bullet, kept beside the arrays and packed with them
+        self.owners = [None] * capacity
+        self.rng = np.random.default_rng(seed)
+
+        self.set_tile_map(tile_map)
+
+        # bullet frames shared with the rotation cache and their half extents for hit tests
+        self.angle_step = rotation_cache.step
+        self.images = [rotation_cache.get("bullet", i * self.angle_step) for i in range(rotation_cache.frame_count)]
+        self.half_sizes = np.array([(image.get_width() / 2, image.get_height() / 2) for image in self.images], dtype=np.float64)
+
+    # walls are read from the tile map in one batched query per tick
+    def set_tile_map(self, tile_map):
+        self.tile_map = tile_map
+
+    # remove every bullet
+    def clear(self):
+        self.count = 0
+        self.alive[:] = False
+        self.owners[:] = [None] * self.capacity
+
+    # restart the spread generator from a seed
+    def reseed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    # add a bullet, returns False when the engine is full
+    def spawn(self, x, y, theta, source, tick, owner=None):
+        if self.count >= self.capacity:
+            self.dropped += 1
+            return False
+
+        i = self.count
+        self.pos[i] = (x, y)
+        self.theta[i] = theta
+        self.spawn_tick[i] = tick
+        self.source[i] = source
+        self.alive[i] = True
+        self.owners[i] = owner
+        self.count += 1
+        return True
+
+    # return the rotated image index for each live bullet
+    def image_indices(self):
+        n = self.count
+        return np.round(-self.theta[:n] / self.angle_step).astype(np.int64) % len(self.images)
+
+    # return the paths of some bullets this tick as start, delta, the box each path sweeps and the bullets' half sizes
+    def paths(self, rows, start, half):
+        start_x = start[rows, 0]
+        start_y = start[rows, 1]
+        end_x = self.pos[rows, 0]
+        end_y = self.pos[rows, 1]
+        half_x = half[rows, 0]
+        half_y = half[rows, 1]
+        swept = (np.minimum(start_x, end_x) - half_x, np.minimum(start_y, end_y) - half_y,
+                 np.maximum(start_x, end_x) + half_x, np.maximum(start_y, end_y) + half_y)
+        return start_x, start_y, end_x - start_x, end_y - start_y, swept, half_x, half_y
+
+    # return which of the given paths touch a hitbox and how far along each of those it first does
+    # only paths whose swept box overlaps the hitbox get the full slab test
+    def sweep_hitbox(self, hitbox, paths):
+        start_x, start_y, delta_x, delta_y, (left, top, right, bottom), half_x, half_y = paths
+        near = np.flatnonzero((right > hitbox.left) & (left < hitbox.right) & (bottom > hitbox.top) & (top < hitbox.bottom))
+        if len(near) == 0:
+            return near, np.zeros(0)
+        return near, segment_box_times(start_x[near], start_y[near], delta_x[near], delta_y[near],
+                                       (hitbox.left, hitbox.top, hitbox.right, hitbox.bottom), half_x[near], half_y[near])
+
+    # advance, collide and expire every bullet, returns who fired the bullet that killed the player or None
+    def update(self, tick, player, enemies):
+        n = self.count
+        killed_by = None
+        if n == 0:
+            return killed_by
+
+        # spread is re-rolled every tick like the sprite bullets
+        spread = self.rng.integers(-BULLET_SPREAD, BULLET_SPREAD + 1, n)
+        angle = np.radians(self.theta[:n] + spread)
+        start = self.pos[:n].copy()
+        self.pos[:n, 0] += np.cos(angle) * BULLET_SPEED
+        self.pos[:n, 1] += np.sin(angle) * BULLET_SPEED
+
+        alive = self.alive[:n]
+
+        # each bullet stops at the first wall or hitbox along its path this tick, anything outside the map is floor
+        wall_time = self.tile_map.sweep_walls_many(start[:, 0], start[:, 1], self.pos[:n, 0], self.pos[:n, 1])
+        half = self.half_sizes[self.image_indices()]
+
+        # player bullets against living enemies, each bullet kills the nearest enemy it reaches before a wall
+        rows = np.flatnonzero(alive & (self.source[:n] == BULLET_SOURCE_PLAYER))
+        if len(rows) and enemies:
+            paths = self.paths(rows, start, half)
+            hit_time = wall_time[rows]
+            hit_enemy = np.full(len(rows), -1)
+            for i, enemy in enumerate(enemies):
+                if not enemy.is_dead and enemy.hitbox.width and enemy.hitbox.height:
+                    near, times = self.sweep_hitbox(enemy.hitbox, paths)
+                    closer = times < hit_time[near]
+                    hit_time[near[closer]] = times[closer]
+                    hit_enemy[near[closer]] = i
+            alive[rows[hit_enemy >= 0]] = False
+            for i in np.unique(hit_enemy[hit_enemy >= 0]).tolist():
+                enemies[i].die()
+
+        # enemy bullets against the player
+        rows = np.flatnonzero(alive & (self.source[:n] == BULLET_SOURCE_ENEMY))
+        if len(rows) and player.alive():
+            near, times = self.sweep_hitbox(player.hitbox, self.paths(rows, start, half))
+            hits = rows[near[times < wall_time[rows[near]]]]
+            if len(hits):
+                # the earliest fired of the bullets that reach the player takes the kill, as it would in the sprite update order
+                alive[hits] = False
+                player.kill()
+                killed_by = self.owners[hits[0]]
+
+        alive &= np.isinf(wall_time)
+
+        # a bullet past its lifetime is removed but still collides on its last tick
+        alive &= (tick - self.spawn_tick[:n]) <= BULLET_LIFETIME_TICKS
+
+        self.compact()
+        return killed_by
+
+    # pack the surviving bullets to the front of the arrays
+    def compact(self):
+        n = self.count
+        keep = np.flatnonzero(self.alive[:n])
+        m = len(keep)
+        if m != n:
+            self.pos[:m] = self.pos[keep]
+            self.theta[:m] = self.theta[keep]
+            self.spawn_tick[:m] = self.spawn_tick[keep]
+            self.source[:m] = self.source[keep]
+            self.owners[:n] = [self.owners[i] for i in keep.tolist()] + [None] * (n - m)
+            self.alive[:m] = True
+            self.alive[m:n] = False
+            self.count = m
+
+    # draw bullets that are inside the viewport
+    def draw(self, surface, offset):
+        n = self.count
+        if n == 0:
+            return
+
+        width, height = surface.get_size()
+        indices = self.image_indices()
+        half = self.half_sizes[indices]
+        x = self.pos[:n, 0] - offset[0] - half[:, 0]
+        y = self.pos[:n, 1] - offset[1] - half[:, 1]
+        visible = np.flatnonzero((x > -2 * half[:, 0]) & (x < width) & (y > -2 * half[:, 1]) & (y < height))
+
+        images = self.images
+        surface.blits([(images[i], (px, py)) for i, px, py in zip(indices[visible].tolist(), x[visible].tolist(), y[visible].tolist())], False)
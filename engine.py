@@ -0,0 +1,879 @@
+# importing modules
+import os
+import math
+import random
+import itertools
+import functools
+from collections import OrderedDict
+import pygame
+from settings import *
+from spatial_hash import SpatialHash
+from entities import Entity, EntityStore
+from pool import EntityPool
+from rotation_cache import RotationCache
+from assets import load_atlas, rotation_specs
+from visibility import VisibilityIndex
+from map_compiler import load_map
+from streamed_map import is_streamed, load_streamed
+from flow_field import FlowField
+from sweep import segment_box_time
+from bullet_engine import BulletEngine, BULLET_SOURCE_PLAYER, BULLET_SOURCE_ENEMY
+from profiler import profiler
+
+# numpy is optional, walls are kept in lists and sight always casts rays without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# start pygame without a window, images still need a display mode to be converted
+def init_headless():
+    if not pygame.display.get_init():
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+
+# return the scaled images used by the simulation from the asset atlas, a display mode must be set first
+def load_images(atlas=None):
+    atlas = atlas or load_atlas()
+    return {name: atlas.images[name] for name in ("player", "bullet", "enemy", "enemy_dead", "drop_gun")}
+
+# player controls for one tick, the mouse position is in screen coordinates
+class PlayerInput:
+    def __init__(self, up=False, left=False, down=False, right=False, shoot=False, mouse_pos=(SCREEN_WIDTH // 2 + 1, SCREEN_HEIGHT // 2)):
+        self.up = up
+        self.left = left
+        self.down = down
+        self.right = right
+        self.shoot = shoot
+        self.mouse_pos = mouse_pos
+
+    # read the controls from the keyboard and mouse
+    @classmethod
+    def from_pygame(cls):
+        keys = pygame.key.get_pressed()
+        return cls(keys[pygame.K_w], keys[pygame.K_a], keys[pygame.K_s], keys[pygame.K_d], pygame.mouse.get_pressed() == (1, 0, 0), pygame.mouse.get_pos())
+
+    # aim at a point in the world, the camera keeps the player at the centre of the screen
+    def aim_at(self, player, world_pos):
+        self.mouse_pos = (world_pos[0] - player.rect.centerx + SCREEN_WIDTH // 2, world_pos[1] - player.rect.centery + SCREEN_HEIGHT // 2)
+        return self
+
+# player class
+class Player(Entity):
+    __slots__ = ("game", "image", "pos", "hitbox", "rect", "speed", "shoot", "shoot_cooldown", "ammo", "shots_fired", "theta", "velocity_x", "velocity_y")
+
+    def __init__(self, game):
+        super().__init__()
+        self.game = game
+        self.image = game.images["player"]
+        self.pos = pygame.math.Vector2(PLAYERSTART_X, PLAYERSTART_Y*0.5)
+
+        # calculate hitbox rect
+        hitbox_size = pygame.Vector2(80, 80)
+        hitbox_offset = pygame.Vector2(-hitbox_size.x // 2, -hitbox_size.y // 2)
+        self.hitbox = pygame.Rect(self.pos.x + hitbox_offset.x, self.pos.y + hitbox_offset.y, hitbox_size.x, hitbox_size.y)
+        self.rect = self.hitbox.copy()
+        self.speed = PLAYER_SPEED
+        self.shoot = False
+        self.shoot_cooldown = 0
+        self.ammo = AMMO_COUNT
+        self.shots_fired = 0
+        self.theta = 0
+        self.velocity_x = 0
+        self.velocity_y = 0
+
+    # apply the controls for this tick
+    def user_input(self):
+        self.velocity_x = 0
+        self.velocity_y = 0
+        controls = self.game.player_input
+
+        if controls.up:
+            self.velocity_y = -self.speed
+        if controls.left:
+            self.velocity_x = -self.speed
+        if controls.down:
+            self.velocity_y = self.speed
+        if controls.right:
+            self.velocity_x = self.speed
+
+        # check for diagonal movement
+        if self.velocity_x != 0 and self.velocity_y != 0:
+            self.velocity_x /= math.sqrt(2)
+            self.velocity_y /= math.sqrt(2)
+
+        # check for shooting
+        if controls.shoot:
+            self.shoot = True
+            self.is_shooting()
+        else:
+            self.shoot = False
+
+    # move character
+    def move(self):
+        # save current position
+        original_pos = self.pos.copy()
+
+        # move player
+        self.pos += (self.velocity_x, self.velocity_y)
+        self.hitbox.center = self.pos
+        self.rect.center = self.hitbox.center
+
+        # check if player is moving into a wall
+        if self.game.tile_map.is_wall(self.rect.centerx, self.rect.centery):
+            self.pos = original_pos
+            self.hitbox.center = self.pos
+            self.rect.center = self.hitbox.center
+
+    # point player sprite in direction of mouse pointer
+    def aim(self):
+        mouse_pos = self.game.player_input.mouse_pos
+        self.theta = math.degrees(math.atan2(mouse_pos[1] - SCREEN_HEIGHT // 2, mouse_pos[0] - SCREEN_WIDTH // 2))
+        self.image = self.game.rotation_cache.get("player", -self.theta)
+        self.rect = self.image.get_rect(center = self.hitbox.center)
+
+    # refresh shooting cooldown
+    def is_shooting(self):
+        if self.shoot_cooldown == 0 and self.shoot and self.ammo > 0:
+            self.shoot_cooldown = SHOOT_COOLDOWN
+            self.create_bullet()
+
+            # change ammo counter
+            self.ammo -= 1
+            self.shots_fired += 1
+
+    # instantiate a bullet
+    def create_bullet(self):
+        bullet_pos = self.pos + pygame.math.Vector2(GUN_OFFSET_X, GUN_OFFSET_Y).rotate(self.theta)
+        bullet_rect = self.game.images["bullet"].get_rect(center=(bullet_pos.x, bullet_pos.y))
+
+        if not self.game.tile_map.is_wall(bullet_rect.centerx, bullet_rect.centery):
+            self.game.spawn_bullet(bullet_pos.x, bullet_pos.y, self.theta, "player")
+
+    # check for collision between player and gun drop
+    def ammo_pickup(self):
+        game = self.game
+        for weapon in game.spatial_hash.query(self.rect):
+            if weapon.store is game.drops:
+                game.remove_drop(weapon)
+                self.ammo = AMMO_COUNT
+
+    # draw player hitbox for debugging
+    def draw_hitbox(self, surface, camera_offset):
+        adjusted_hitbox = self.hitbox.move(-camera_offset[0], -camera_offset[1])
+        pygame.draw.rect(surface, RED, adjusted_hitbox, 2)
+
+    # update player
+    def update(self):
+        self.user_input()
+        self.move()
+        self.aim()
+        self.game.spatial_hash.update(self)
+        self.ammo_pickup()
+
+        # reduce time before next shot each tick
+        if self.shoot_cooldown > 0:
+            self.shoot_cooldown -= 1
+
+# bullet class
+class Bullet(Entity):
+    __slots__ = ("game", "owner", "image", "rect", "pos", "theta", "spawn_tick", "source")
+
+    def __init__(self, game, x ,y, theta, source, owner=None):
+        super().__init__()
+        self.game = game
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.pos = pygame.Vector2()
+        self.reset(x, y, theta, source, owner)
+
+    # set the bullet up for a new shot, pooled bullets are reset rather than made again
+    def reset(self, x, y, theta, source, owner=None):
+        self.owner = owner
+        self.image = self.game.rotation_cache.get("bullet", -theta)
+        self.rect.size = self.image.get_size()
+        self.rect.center = (x, y)
+        self.pos.update(x, y)
+        self.theta = theta
+        self.spawn_tick = self.game.tick_count
+        self.source = source
+
+    # return how far along this tick's path the bullet first touches a hitbox, None if it misses
+    # the hitbox is grown by half the bullet's size so the path of its centre stands in for the whole bullet
+    def sweep_hitbox(self, start_x, start_y, velocity, hitbox):
+        half_width = self.rect.width / 2
+        half_height = self.rect.height / 2
+        return segment_box_time(start_x, start_y, velocity.x, velocity.y,
+                                (hitbox.left - half_width, hitbox.top - half_height, hitbox.right + half_width, hitbox.bottom + half_height))
+
+    # check if an entity can be hit by this bullet
+    def can_hit(self, entity):
+        if self.source == "player":
+            return entity.store is self.game.enemies
+        return entity.store is self.game.players
+
+    # kill an enemy the bullet reached
+    def check_enemy_collision(self, enemy):
+        enemy.die()
+        self.kill()
+
+    # kill the player the bullet reached
+    def check_player_collision(self, player):
+        player.kill()
+        self.game.spatial_hash.remove(player)
+        self.game.killed_by = self.owner
+        self.kill()
+
+    # move the bullet with its spread rolled again, then stop it at the first wall or hitbox along its path
+    def update(self):
+        game = self.game
+        angle = math.radians(self.theta + game.rng.randint(-BULLET_SPREAD, BULLET_SPREAD))
+        velocity = pygame.Vector2(math.cos(angle), math.sin(angle)) * BULLET_SPEED
+        start_x, start_y = self.pos
+        self.pos += velocity
+        self.rect.center = self.pos
+
+        # a bullet past its lifetime is removed but still collides on its last tick
+        if game.tick_count - self.spawn_tick > BULLET_LIFETIME_TICKS:
+            self.kill()
+
+        wall_time = game.tile_map.sweep_walls((start_x, start_y), self.pos)
+        swept_rect = self.rect.union(self.rect.move(-velocity.x, -velocity.y))
+        hits = []
+        for entity in game.spatial_hash.query(swept_rect):
+            if self.can_hit(entity):
+                entity_time = self.sweep_hitbox(start_x, start_y, velocity, entity.hitbox)
+                if entity_time is not None and (wall_time is None or entity_time < wall_time):
+                    hits.append((entity_time, entity.pos.x, entity.pos.y, entity))
+
+        if hits:
+            # hitboxes entered at the same time are settled by position, not by the hash's set order, so replays stay in step
+            hit_entity = min(hits, key=lambda hit: hit[:3])[3]
+            if hit_entity.store is game.players:
+                self.check_player_collision(hit_entity)
+            else:
+                self.check_enemy_collision(hit_entity)
+        elif wall_time is not None:
+            self.kill()
+
+# dropped weapon class, drops never change so they have no update
+class DroppedWeapon(Entity):
+    __slots__ = ("image", "rect")
+
+    def __init__(self, game, x, y):
+        super().__init__()
+        self.image = game.images["drop_gun"]
+        self.rect = self.image.get_rect(center=(x, y))
+
+    # move the drop for reuse, the image never changes
+    def reset(self, x, y):
+        self.rect.center = (x, y)
+
+# enemy class
+class Enemy(Entity):
+    __slots__ = ("game", "image", "pos", "spawn_location", "hitbox", "rect", "enemy_theta", "reaction_time", "enemy_shoot_cooldown", "is_dead", "can_see_player")
+
+    def __init__(self, game, spawn_location):
+        super().__init__()
+        self.game = game
+        self.image = game.images["enemy"]
+        self.pos = pygame.math.Vector2(spawn_location)
+        self.spawn_location = spawn_location
+        self.hitbox = self.image.get_rect(center = self.pos)
+        self.rect = self.hitbox.copy()
+        self.enemy_theta = 0
+        self.reaction_time = ENEMY_REACTION_TIME
+        self.enemy_shoot_cooldown = 0
+        self.is_dead = False
+        self.can_see_player = False
+
+    # move enemy, the direction is from the enemy to the player at the start of the tick
+    def move(self, direction):
+        distance = direction.length()
+
+        # check for zero division error
+        if ENEMY_CHASE and distance > 0:
+            # save current position
+            original_pos = self.pos.copy()
+            flow_field = self.game.flow_field
+
+            # head straight for the player on the same tile, otherwise follow the flow field
+            if flow_field.target_tile == (int(self.pos.x // TILE_SIZE), int(self.pos.y // TILE_SIZE)):
+                self.pos += direction.normalize() * min(distance, ENEMY_SPEED)
+            else:
+                self.pos += pygame.math.Vector2(flow_field.direction_at(self.pos)) * ENEMY_SPEED
+
+            # redefine the enemy rect
+            self.rect.center = (int(self.pos.x), int(self.pos.y))
+            self.hitbox.center = self.rect.center
+
+            # check for wall collision
+            if self.game.tile_map.is_wall(self.rect.centerx, self.rect.centery):
+                self.pos = original_pos
+                self.hitbox.center = self.pos
+                self.rect.center = self.hitbox.center
+
+    # aim enemy
+    def aim(self, direction):
+        self.enemy_theta = direction.angle_to(pygame.math.Vector2(1, 0))
+        self.image = self.game.rotation_cache.get("enemy", self.enemy_theta)
+        self.rect = self.image.get_rect(center = self.hitbox.center)
+
+    # enemy shooting logic
+    def shoot(self, direction):
+        if self.enemy_shoot_cooldown == 0:
+            self.enemy_shoot_cooldown = ENEMY_SHOOT_COOLDOWN
+            self.create_bullet(direction)
+
+    # create bullet
+    def create_bullet(self, direction):
+        self.enemy_theta = math.atan2(direction.y, direction.x)
+        bullet_pos = self.pos + pygame.math.Vector2(ENEMY_GUN_OFFSET_X, ENEMY_GUN_OFFSET_Y).rotate(math.degrees(self.enemy_theta))
+        bullet_rect = self.game.images["bullet"].get_rect(center=(bullet_pos.x, bullet_pos.y))
+
+        if not self.game.tile_map.is_wall(bullet_rect.centerx, bullet_rect.centery):
+            self.game.spawn_bullet(bullet_pos.x, bullet_pos.y, math.degrees(self.enemy_theta), "enemy", self)
+
+    # swap to dead sprite and remove collider
+    def die(self):
+        game = self.game
+        self.is_dead = True
+        self.image = game.rotation_cache.get("enemy_dead", -self.enemy_theta)
+        self.hitbox = pygame.Rect(0, 0, 0, 0)
+        game.spatial_hash.remove(self)
+        game.kill_count += 1
+
+        # bake the corpse into the map so it no longer costs a sprite update and blit
+        if BAKE_CORPSES:
+            game.tile_map.stamp(self, self.image, self.rect.topleft)
+            self.kill()
+        else:
+            game.corpses.add(self)
+
+        # probability for enemy to drop a gun
+        # a full drop pool that refuses leaves nothing behind
+        if game.rng.randint(1, 100) <= DROP_CHANCE:
+            dropped_weapon = game.drop_pool.acquire(self.pos.x, self.pos.y)
+            if dropped_weapon is None:
+                return
+            game.spatial_hash.insert(dropped_weapon)
+            if BAKE_DROPS:
+                game.tile_map.stamp(dropped_weapon, dropped_weapon.image, dropped_weapon.rect.topleft)
+
+    # draw hitbox for debugging
+    def draw_hitbox(self, surface, camera_offset):
+        drawn_hitbox = self.hitbox.move(-camera_offset[0], -camera_offset[1])
+        pygame.draw.rect(surface, RED, drawn_hitbox, 2)
+
+    # update a living enemy
+    def update(self, player_pos):
+        direction = player_pos - self.pos
+        self.move(direction)
+
+        # if enemy has line of sight to the player
+        if self.can_see_player:
+            self.reaction_time -= 1
+            if self.reaction_time <= 0:
+                self.aim(direction)
+                self.shoot(direction)
+
+        # otherwise refresh reaction time
+        else:
+            self.reaction_time = ENEMY_REACTION_TIME
+
+        # reduce cooldown
+        if self.enemy_shoot_cooldown > 0:
+            self.enemy_shoot_cooldown -= 1
+
+        # move to the broadphase cells the enemy covers after moving and turning, bullets later this tick query them
+        self.game.spatial_hash.update(self)
+
+# tile map class
+class TileMap(pygame.sprite.Sprite):
+    def __init__(self, map_filename):
+        super().__init__()
+
+        # load the compiled level, the text map is compiled and cached on first use
+        # large maps are memory mapped instead and only the parts around the player and enemies stay resident
+        self.streamed = None
+        if is_streamed(map_filename):
+            level = self.streamed = load_streamed(map_filename)
+            self.is_wall_tile = level.is_wall_tile
+        else:
+            level = load_map(map_filename)
+        map_width = level.width
+        map_length = level.height
+
+        # tiles are drawn into chunk surfaces when they first come into view
+        self.rect = pygame.Rect(0, 0, map_width * TILE_SIZE, map_length * TILE_SIZE)
+        self.chunks = OrderedDict()
+        self.chunks_baked = 0
+
+        # images stamped onto the chunks, listed per chunk in drawing order
+        self.stamps = {}
+        self.stamp_chunks = {}
+
+        self.width = map_width
+        self.height = map_length
+
+
+        # walls as a contiguous boolean grid with a floor border a tile wide around the map
+        # batched queries clip coordinates onto the border, so anything outside the map reads as floor without a mask
+        # single queries read the same memory through a flat memoryview, which indexes faster than numpy scalars
+        # without numpy the padded grid is a flat list instead
+        self.wall_grid = None
+        self.wall_cells = None
+        self.grid_width = map_width + 2
+        if self.streamed is None:
+            if np is not None:
+                self.wall_grid = np.zeros((map_length + 2, map_width + 2), dtype=bool)
+                self.wall_grid[1:-1, 1:-1] = level.walls
+                self.wall_cells = memoryview(self.wall_grid.reshape(-1))
+            else:
+                self.wall_cells = [False] * self.grid_width
+                for row in level.walls:
+                    self.wall_cells += [False] + list(row) + [False]
+                self.wall_cells += [False] * self.grid_width
+        self.exit_tiles = set(level.exit_tiles)
+        self.enemy_spawn_locations = [(x * TILE_SIZE, y * TILE_SIZE) for x, y in level.enemy_spawns]
+        self.player_spawn_location = [(x * TILE_SIZE, y * TILE_SIZE) for x, y in level.player_spawns]
+        self.exit_tile_location = None
+        if level.exit_tile is not None:
+            self.exit_tile_location = (level.exit_tile[0] * TILE_SIZE, level.exit_tile[1] * TILE_SIZE)
+
+        # precompute which floor tiles can see each other
+        self.visibility = None
+        if self.streamed is None and VISIBILITY_INDEX and np is not None and map_width * map_length <= VISIBILITY_MAX_TILES:
+            self.visibility = VisibilityIndex.for_map(map_filename, self.wall_rows())
+
+    # describe the visibility index and the streamed map, empty when the map has neither
+    def report(self):
+        return "\n".join(part.report() for part in (self.visibility, self.streamed) if part is not None)
+
+    # check if tile is within range and if type is a wall
+    def is_wall(self, x, y):
+        tile_x = int(x // TILE_SIZE)
+        tile_y = int(y // TILE_SIZE)
+
+        # return true if wall, false if not
+        return self.is_wall_tile(tile_x, tile_y)
+
+    # check if a tile index is a wall, anything outside the map is floor
+    def is_wall_tile(self, tile_x, tile_y):
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            return self.wall_cells[(tile_y + 1) * self.grid_width + tile_x + 1]
+        return False
+
+    # check many points at once with numpy, returns a boolean array with one entry per point
+    def is_wall_many(self, xs, ys):
+        tile_x = np.floor_divide(np.asarray(xs, dtype=np.float64), TILE_SIZE).astype(np.int64)
+        tile_y = np.floor_divide(np.asarray(ys, dtype=np.float64), TILE_SIZE).astype(np.int64)
+        return self.is_wall_tiles(tile_x, tile_y)
+
+    # check many tile indices at once with numpy
+    def is_wall_tiles(self, tile_x, tile_y):
+        if self.streamed is not None:
+            return self.streamed.is_wall_tiles(tile_x, tile_y)
+
+        # tiles outside the map land on the floor border
+        return self.wall_grid[np.clip(tile_y, -1, self.height) + 1, np.clip(tile_x, -1, self.width) + 1]
+
+    # set up a walk over the tiles a ray from a start point along a direction crosses
+    # returns the start tile, the step direction on each axis, how far along the direction one tile is on each axis
+    # and how far it is to the first vertical and horizontal tile edge, in units of the direction's length
+    @staticmethod
+    def tile_walk(start_x, start_y, dir_x, dir_y):
+        tile_x = int(start_x // TILE_SIZE)
+        tile_y = int(start_y // TILE_SIZE)
+        if dir_x > 0:
+            step_x, t_delta_x, t_max_x = 1, TILE_SIZE / dir_x, ((tile_x + 1) * TILE_SIZE - start_x) / dir_x
+        elif dir_x < 0:
+            step_x, t_delta_x, t_max_x = -1, -TILE_SIZE / dir_x, (tile_x * TILE_SIZE - start_x) / dir_x
+        else:
+            step_x, t_delta_x, t_max_x = 0, math.inf, math.inf
+        if dir_y > 0:
+            step_y, t_delta_y, t_max_y = 1, TILE_SIZE / dir_y, ((tile_y + 1) * TILE_SIZE - start_y) / dir_y
+        elif dir_y < 0:
+            step_y, t_delta_y, t_max_y = -1, -TILE_SIZE / dir_y, (tile_y * TILE_SIZE - start_y) / dir_y
+        else:
+            step_y, t_delta_y, t_max_y = 0, math.inf, math.inf
+        return tile_x, tile_y, step_x, step_y, t_delta_x, t_delta_y, t_max_x, t_max_y
+
+    # return how far along a segment it first enters a wall tile, as a fraction from 0 to 1, or None if it stays clear
+    # the tiles the segment crosses are walked in order, so fast movers cannot skip a wall
+    def sweep_walls(self, start, end):
+        start_x, start_y = start
+        delta_x = end[0] - start_x
+        delta_y = end[1] - start_y
+
+        # measured in fractions of the segment
+        tile_x, tile_y, step_x, step_y, t_delta_x, t_delta_y, t_max_x, t_max_y = self.tile_walk(start_x, start_y, delta_x, delta_y)
+        tile_count = abs(int(end[0] // TILE_SIZE) - tile_x) + abs(int(end[1] // TILE_SIZE) - tile_y) + 1
+
+        t_enter = 0.0
+        for _ in range(tile_count):
+            if self.is_wall_tile(tile_x, tile_y):
+                return t_enter
+            if t_max_x < t_max_y:
+                tile_x += step_x
+                t_enter = t_max_x
+                t_max_x += t_delta_x
+            else:
+                tile_y += step_y
+                t_enter = t_max_y
+                t_max_y += t_delta_y
+        return None
+
+    # sweep many segments at once with numpy, every segment takes a tile step together
+    # returns the wall entry fraction for every segment, infinity where it stays clear
+    def sweep_walls_many(self, start_x, start_y, end_x, end_y):
+        delta_x = end_x - start_x
+        delta_y = end_y - start_y
+        tile_x = np.floor_divide(start_x, TILE_SIZE).astype(np.int64)
+        tile_y = np.floor_divide(start_y, TILE_SIZE).astype(np.int64)
+        steps_left = np.abs(np.floor_divide(end_x, TILE_SIZE).astype(np.int64) - tile_x) + np.abs(np.floor_divide(end_y, TILE_SIZE).astype(np.int64) - tile_y)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step_x = np.sign(delta_x).astype(np.int64)
+            step_y = np.sign(delta_y).astype(np.int64)
+            t_delta_x = np.where(delta_x != 0, TILE_SIZE / np.abs(delta_x), math.inf)
+            t_delta_y = np.where(delta_y != 0, TILE_SIZE / np.abs(delta_y), math.inf)
+            t_max_x = np.where(delta_x != 0, ((tile_x + (step_x > 0)) * TILE_SIZE - start_x) / delta_x, math.inf)
+            t_max_y = np.where(delta_y != 0, ((tile_y + (step_y > 0)) * TILE_SIZE - start_y) / delta_y, math.inf)
+
+        hit_time = np.full(len(start_x), math.inf)
+        t_enter = np.zeros(len(start_x))
+        active = np.ones(len(start_x), dtype=bool)
+        for _ in range(int(steps_left.max(initial=0)) + 1):
+            hit = active & self.is_wall_tiles(tile_x, tile_y)
+            hit_time[hit] = t_enter[hit]
+            active &= ~hit & (steps_left > 0)
+            if not active.any():
+                break
+
+            # step every active segment into its next tile
+            along_x = active & (t_max_x < t_max_y)
+            along_y = active & ~along_x
+            tile_x += np.where(along_x, step_x, 0)
+            tile_y += np.where(along_y, step_y, 0)
+            t_enter = np.where(along_x, t_max_x, np.where(along_y, t_max_y, t_enter))
+            t_max_x = np.where(along_x, t_max_x + t_delta_x, t_max_x)
+            t_max_y = np.where(along_y, t_max_y + t_delta_y, t_max_y)
+            steps_left -= active
+        return hit_time
+
+    # check for walls between two points by walking the tiles the ray crosses
+    # only one pixel spaced samples along the ray count as hits so results match stepping the ray a pixel at a time
+    def has_line_of_sight(self, start, end):
+        start_x, start_y = start
+        delta_x = end[0] - start_x
+        delta_y = end[1] - start_y
+        length = math.sqrt(delta_x * delta_x + delta_y * delta_y)
+        last_sample = int(length) - 1
+        if last_sample < 0:
+            return True
+
+        # measured in pixels along the ray
+        dir_x = delta_x / length
+        dir_y = delta_y / length
+        tile_x, tile_y, step_x, step_y, t_delta_x, t_delta_y, t_max_x, t_max_y = self.tile_walk(start_x, start_y, dir_x, dir_y)
+
+        t_enter = 0
+        while t_enter <= last_sample:
+            t_exit = min(t_max_x, t_max_y)
+
+            # a wall tile only blocks if a sample point lands in a wall
+            if self.is_wall_tile(tile_x, tile_y):
+                first = max(0, int(t_enter) - 1)
+                last = min(last_sample, int(min(t_exit, last_sample)) + 1)
+                for i in range(first, last + 1):
+                    if self.is_wall_tile(int((start_x + dir_x * i) // TILE_SIZE), int((start_y + dir_y * i) // TILE_SIZE)):
+                        return False
+
+            # step into the next tile
+            if t_max_x < t_max_y:
+                tile_x += step_x
+                t_enter = t_max_x
+                t_max_x += t_delta_x
+            else:
+                tile_y += step_y
+                t_enter = t_max_y
+                t_max_y += t_delta_y
+
+        return True
+
+    # check line of sight with the visibility index, falling back to a ray for shadow edges
+    def can_see(self, start, end):
+        if self.visibility is not None:
+            result = self.visibility.lookup((int(start[0] // TILE_SIZE), int(start[1] // TILE_SIZE)), (int(end[0] // TILE_SIZE), int(end[1] // TILE_SIZE)))
+            if result is not None:
+                return result
+        return self.has_line_of_sight(start, end)
+
+    # check line of sight from many points to one target
+    def line_of_sight_many(self, starts, end):
+        results = {}
+        for start in starts:
+            if start not in results:
+                results[start] = self.can_see(start, end)
+        return [results[start] for start in starts]
+
+    # return wall flags as equal length rows
+    def wall_rows(self):
+        stride = self.grid_width
+        return [list(self.wall_cells[(y + 1) * stride + 1:(y + 2) * stride - 1]) for y in range(self.height)]
+    
+    # return enemy spawn locations
+    def get_enemy_spawn_locations(self):
+        return self.enemy_spawn_locations
+
+    # draw the map
+    def draw(self, surface, position=(0,0)):
+        self.rect.topleft = position
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        chunks_x = (self.width + CHUNK_SIZE - 1) // CHUNK_SIZE
+        chunks_y = (self.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+        # only blit the chunks that overlap the surface
+        view_width, view_height = surface.get_size()
+        first_x = max(0, int(-position[0] // chunk_pixels))
+        first_y = max(0, int(-position[1] // chunk_pixels))
+        last_x = min(chunks_x - 1, int((view_width - position[0] - 1) // chunk_pixels))
+        last_y = min(chunks_y - 1, int((view_height - position[1] - 1) // chunk_pixels))
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                surface.blit(self.get_chunk(chunk_x, chunk_y), (position[0] + chunk_x * chunk_pixels, position[1] + chunk_y * chunk_pixels))
+
+    # return a chunk surface, baking it if it is not cached
+    def get_chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        chunk = self.bake_chunk(chunk_x, chunk_y)
+        self.chunks[key] = chunk
+
+        # drop the least recently drawn chunks
+        while len(self.chunks) > MAX_CACHED_CHUNKS:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    # draw the tiles of one chunk onto a new surface
+    def bake_chunk(self, chunk_x, chunk_y):
+        chunk = pygame.Surface((CHUNK_SIZE * TILE_SIZE, CHUNK_SIZE * TILE_SIZE))
+        first_x = chunk_x * CHUNK_SIZE
+        first_y = chunk_y * CHUNK_SIZE
+        for y in range(first_y, min(first_y + CHUNK_SIZE, self.height)):
+            for x in range(first_x, min(first_x + CHUNK_SIZE, self.width)):
+                if self.is_wall_tile(x, y):
+                    tile_rect = pygame.Rect((x - first_x) * TILE_SIZE, (y - first_y) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                    chunk.fill(RED if (x, y) in self.exit_tiles else GREEN, tile_rect)
+
+        # draw anything stamped onto this chunk
+        for key, image, pos in self.stamps.get((chunk_x, chunk_y), []):
+            chunk.blit(image, (pos[0] - first_x * TILE_SIZE, pos[1] - first_y * TILE_SIZE))
+
+        self.chunks_baked += 1
+        return chunk
+
+    # permanently draw an image onto the map, the key is used to remove it later
+    def stamp(self, key, image, pos):
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        stamp_rect = image.get_rect(topleft=pos)
+        chunk_keys = [(chunk_x, chunk_y)
+                      for chunk_y in range(stamp_rect.top // chunk_pixels, (stamp_rect.bottom - 1) // chunk_pixels + 1)
+                      for chunk_x in range(stamp_rect.left // chunk_pixels, (stamp_rect.right - 1) // chunk_pixels + 1)]
+        self.stamp_chunks[key] = chunk_keys
+
+        for chunk_key in chunk_keys:
+            self.stamps.setdefault(chunk_key, []).append((key, image, pos))
+
+            # draw straight onto chunks that are already baked
+            chunk = self.chunks.get(chunk_key)
+            if chunk is not None:
+                chunk.blit(image, (pos[0] - chunk_key[0] * chunk_pixels, pos[1] - chunk_key[1] * chunk_pixels))
+
+    # remove a stamped image, affected chunks are baked again when next drawn
+    def unstamp(self, key):
+        for chunk_key in self.stamp_chunks.pop(key, []):
+            self.stamps[chunk_key] = [stamp for stamp in self.stamps[chunk_key] if stamp[0] is not key]
+            self.chunks.pop(chunk_key, None)
+
+    # remove every stamped image
+    def clear_stamps(self):
+        for chunk_key in self.stamps:
+            self.chunks.pop(chunk_key, None)
+        self.stamps.clear()
+        self.stamp_chunks.clear()
+
+# the game simulation, updated one tick at a time with programmatic inputs and no rendering
+class Game:
+    def __init__(self, map_filename=MAP_FILENAME, seed=GAME_SEED):
+        self.map_filename = map_filename
+
+        # time is counted in fixed ticks of the simulation, never read from the pygame clock
+        self.tick_count = 0
+        self.start_tick = 0
+
+        # every random roll comes from this generator, games without a seed pick a new one each run
+        self.seed = seed
+        self.run_seed = None
+        self.rng = random.Random()
+        self.kill_count = 0
+        self.killed_by = None
+        self.player_input = PlayerInput()
+
+        # pre-rotated copies of the images that turn every frame, frames already in the atlas are used as they are
+        atlas = load_atlas()
+        self.images = load_images(atlas)
+        self.rotation_cache = RotationCache(ROTATION_STEP, ROTATION_CACHE_MAX_MB * 1024 * 1024)
+        for name, (scale, smooth) in rotation_specs().items():
+            self.rotation_cache.add(name, self.images[name], scale, smooth)
+            self.rotation_cache.preload(name, atlas.frames.get(name, []))
+        if not ROTATION_CACHE_LAZY:
+            self.rotation_cache.build()
+
+        self.tile_map = TileMap(map_filename)
+
+        # shared path towards the player for chasing enemies
+        self.flow_field = FlowField(self.tile_map)
+
+        # one store for each type of entity, dead enemies move to the corpses while they are drawn as sprites
+        self.players = EntityStore()
+        self.enemies = EntityStore()
+        self.bullets = EntityStore()
+        self.drops = EntityStore()
+        self.corpses = EntityStore()
+
+        # bullets and drops are recycled through pools instead of being made for every shot and drop
+        self.bullet_pool = EntityPool(self.bullets, functools.partial(Bullet, self), BULLET_POOL_CAPACITY, BULLET_POOL_OVERFLOW)
+        self.drop_pool = EntityPool(self.drops, functools.partial(DroppedWeapon, self), DROP_POOL_CAPACITY, DROP_POOL_OVERFLOW, self.remove_drop)
+
+        # broadphase for bullet and pickup collisions
+        self.spatial_hash = SpatialHash(TILE_SIZE)
+
+        # optional array based bullets, replaces the Bullet sprites when enabled
+        self.bullet_engine = None
+        if USE_BULLET_ENGINE and np is not None:
+            self.bullet_engine = BulletEngine(self.tile_map, self.rotation_cache, BULLET_ENGINE_CAPACITY)
+
+        self.new_game()
+
+    # simulated time since the current run started in milliseconds
+    @property
+    def elapsed_time(self):
+        return (self.tick_count - self.start_tick) * 1000 / TICK_RATE
+
+    # restart game after death, the same seed replays the same rolls for the same inputs
+    def new_game(self, seed=None):
+        if seed is None:
+            seed = self.seed if self.seed is not None else random.getrandbits(32)
+        self.run_seed = seed
+        self.rng.seed(seed)
+        self.killed_by = None
+
+        # empty every entity store
+        for store in (self.players, self.enemies, self.bullets, self.drops, self.corpses):
+            store.empty()
+        self.tile_map.clear_stamps()
+        if self.bullet_engine:
+            self.bullet_engine.clear()
+            self.bullet_engine.reseed(seed)
+
+        self.start_tick = self.tick_count
+
+        # respawn all relevant sprites at initial positions
+        self.player = Player(self)
+        self.players.add(self.player)
+        if self.tile_map.player_spawn_location:
+            self.player.pos = pygame.math.Vector2(self.tile_map.player_spawn_location[0])
+
+        for spawn_location in self.tile_map.get_enemy_spawn_locations():
+            self.enemies.add(Enemy(self, spawn_location))
+
+    # add a bullet fired by the player or an enemy, the owner is remembered if it kills the player
+    def spawn_bullet(self, x, y, theta, source, owner=None):
+        if self.bullet_engine:
+            self.bullet_engine.spawn(x, y, theta, BULLET_SOURCE_PLAYER if source == "player" else BULLET_SOURCE_ENEMY, self.tick_count, owner)
+            return
+
+        self.bullet_pool.acquire(x, y, theta, source, owner)
+
+    # take a dropped weapon out of play, off the map and out of the broadphase
+    def remove_drop(self, drop):
+        drop.kill()
+        self.spatial_hash.remove(drop)
+        self.tile_map.unstamp(drop)
+
+    # update line of sight from every living enemy to the player in one pass
+    def update_enemy_sight(self):
+        enemies = self.enemies.sprites()
+        sight = self.tile_map.line_of_sight_many([enemy.rect.center for enemy in enemies], self.player.rect.center)
+        for enemy, can_see in zip(enemies, sight):
+            enemy.can_see_player = can_see
+
+    # everything drawn as a sprite apart from the player, baked corpses and drops are drawn with the map instead
+    def drawn_entities(self):
+        drops = () if BAKE_DROPS else self.drops
+        return itertools.chain(self.corpses, drops, self.enemies, self.bullets)
+
+    # check if player has reached exit and all enemies are killed
+    def is_complete(self):
+        exit_location = self.tile_map.exit_tile_location
+        return exit_location is not None and self.player.rect.collidepoint(exit_location) and len(self.enemies) == 0
+
+    # advance the simulation by one tick
+    def step(self, player_input=None):
+        self.player_input = player_input or PlayerInput()
+
+        # rebuild collision broadphase with the sprites bullets can hit
+        # page in the map around the player and the enemies, the rest of a streamed map is left on disk
+        if self.tile_map.streamed is not None:
+            with profiler.section("map streaming"):
+                self.tile_map.streamed.stream([self.player.pos] + [enemy.pos for enemy in self.enemies])
+
+        with profiler.section("broadphase"):
+            self.spatial_hash.rebuild([self.player] + self.enemies.sprites() + self.drops.sprites())
+
+        # check which enemies can see the player and where chasers should head
+        with profiler.section("line of sight"):
+            self.update_enemy_sight()
+        if ENEMY_CHASE:
+            with profiler.section("flow field"):
+                self.flow_field.update(self.player.pos)
+
+        # each type of entity is updated in its own pass, bullets fired during this tick first move on the next one
+        # new bullets are added at the end of the store and a recycling pool takes the oldest from the front, so the bullets to move stay in front
+        # once every older bullet is recycled the pool starts on this tick's shots, and none are left to move
+        moving_bullets = len(self.bullets)
+        recycled_bullets = self.bullet_pool.recycled
+        with profiler.section("player update"):
+            for player in self.players.sprites():
+                player.update()
+        with profiler.section("enemy update"):
+            player_pos = self.player.pos
+            for enemy in self.enemies.sprites():
+                enemy.update(player_pos)
+        with profiler.section("bullet update"):
+            moving_bullets = max(0, moving_bullets - (self.bullet_pool.recycled - recycled_bullets))
+            for bullet in self.bullets.sprites()[:moving_bullets]:
+                bullet.update()
+        if self.bullet_engine:
+            with profiler.section("bullet engine"):
+                killed_by = self.bullet_engine.update(self.tick_count, self.player, self.enemies.sprites())
+                if killed_by is not None:
+                    self.killed_by = killed_by
+
+        self.tick_count += 1
+
+    # step up to a number of ticks, stopping early if the player dies or the stage is completed
+    # the policy is called with the game before each tick and returns the inputs for it
+    def run(self, ticks, policy=None):
+        for tick in range(ticks):
+            if not self.player.alive() or self.is_complete():
+                return tick
+            self.step(policy(self) if policy else None)
+        return ticks
@@ -0,0 +1,71 @@
+# entities are plain records with __slots__ rather than pygame sprites, so each one carries no __dict__ or group bookkeeping
+# every entity belongs to at most one store at a time, the store of its type while it is alive
+
+# base record for anything the game updates and draws
+class Entity:
+    __slots__ = ("store",)
+
+    def __init__(self):
+        self.store = None
+
+    # check if the entity is still in a store
+    def alive(self):
+        return self.store is not None
+
+    # take the entity out of its store
+    def kill(self):
+        if self.store is not None:
+            self.store.remove(self)
+
+# entities of one type in the order they were added, so passes over them run the same way every time
+# a store with a pool hands every entity that leaves it back to the pool
+class EntityStore:
+    __slots__ = ("entities", "pool")
+
+    def __init__(self):
+        # a dict keeps insertion order and removes in constant time
+        self.entities = {}
+        self.pool = None
+
+    # add an entity, moving it out of any store it was in
+    def add(self, entity):
+        if entity.store is not self:
+            entity.kill()
+            self.entities[entity] = None
+            entity.store = self
+
+    # remove an entity if it is in this store
+    def remove(self, entity):
+        if entity.store is self:
+            del self.entities[entity]
+            entity.store = None
+            if self.pool is not None:
+                self.pool.release(entity)
+
+    # remove every entity
+    def empty(self):
+        for entity in self.entities:
+            entity.store = None
+            if self.pool is not None:
+                self.pool.release(entity)
+        self.entities.clear()
+
+    # the entity added longest ago
+    def oldest(self):
+        return next(iter(self.entities))
+
+    # a list of the entities, safe to keep while entities are added and removed
+    def sprites(self):
+        return list(self.entities)
+
+    def __iter__(self):
+        return iter(list(self.entities))
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity in self.entities
+
+    def __bool__(self):
+        return bool(self.entities)
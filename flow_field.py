@@ -0,0 +1,87 @@
+# importing modules
+import math
+import time
+from collections import deque
+from settings import *
+
+# straight steps come first so paths prefer them over diagonals of equal length
+FLOW_OFFSETS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+# breadth first flow field towards a target tile, shared by every chasing enemy
+class FlowField:
+    def __init__(self, tile_map):
+        self.tile_map = tile_map
+        self.width = tile_map.width
+        self.height = tile_map.height
+        self.target_tile = None
+
+        # next tile index towards the target for every tile, -1 if unreachable
+        # only allocated on the first rebuild so maps without chasers never pay for it
+        self.next_tile = None
+
+        # rebuild instrumentation
+        self.rebuild_count = 0
+        self.last_rebuild_time = 0.0
+        self.total_rebuild_time = 0.0
+
+    # rebuild the field if the target moved to a different tile
+    def update(self, target_pos):
+        tile = (int(target_pos[0] // TILE_SIZE), int(target_pos[1] // TILE_SIZE))
+        if tile != self.target_tile:
+            self.rebuild(tile)
+
+    # breadth first search outwards from the target tile
+    def rebuild(self, target_tile):
+        start = time.perf_counter()
+        width = self.width
+        height = self.height
+        is_wall_tile = self.tile_map.is_wall_tile
+        next_tile = [-1] * (width * height)
+        self.target_tile = target_tile
+
+        target_x, target_y = target_tile
+        if 0 <= target_x < width and 0 <= target_y < height:
+            target = target_y * width + target_x
+            next_tile[target] = target
+            queue = deque([(target_x, target_y)])
+            while queue:
+                x, y = queue.popleft()
+                current = y * width + x
+                for dx, dy in FLOW_OFFSETS:
+                    nx = x + dx
+                    ny = y + dy
+                    if not (0 <= nx < width and 0 <= ny < height):
+                        continue
+                    neighbour = ny * width + nx
+                    if next_tile[neighbour] != -1 or is_wall_tile(nx, ny):
+                        continue
+
+                    # do not cut across wall corners
+                    if dx and dy and (is_wall_tile(x + dx, y) or is_wall_tile(x, y + dy)):
+                        continue
+
+                    next_tile[neighbour] = current
+                    queue.append((nx, ny))
+
+        self.next_tile = next_tile
+        self.last_rebuild_time = time.perf_counter() - start
+        self.total_rebuild_time += self.last_rebuild_time
+        self.rebuild_count += 1
+
+    # return a unit vector from a position towards the centre of the next tile on the path
+    def direction_at(self, pos):
+        tile_x = int(pos[0] // TILE_SIZE)
+        tile_y = int(pos[1] // TILE_SIZE)
+        if self.next_tile is None or not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return (0, 0)
+
+        next_tile = self.next_tile[tile_y * self.width + tile_x]
+        if next_tile == -1:
+            return (0, 0)
+
+        next_x = (next_tile % self.width + 0.5) * TILE_SIZE - pos[0]
+        next_y = (next_tile // self.width + 0.5) * TILE_SIZE - pos[1]
+        length = math.hypot(next_x, next_y)
+        if length == 0:
+            return (0, 0)
+        return (next_x / length, next_y / length)
@@ -0,0 +1,61 @@
+# importing modules
+import os
+import bisect
+import sqlite3
+from settings import *
+
+# best times per map, stored in sqlite with an index on (map, time)
+class Leaderboard:
+    def __init__(self, path=LEADERBOARD_PATH, top_count=5):
+        self.top_count = top_count
+        self.connection = sqlite3.connect(path)
+
+        # write ahead logging keeps every committed run even if the game crashes mid write
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, map TEXT NOT NULL, time REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS runs_map_time ON runs (map, time)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS imports (source TEXT PRIMARY KEY)")
+
+        # top times per map kept in memory after the first read
+        self.top_times = {}
+
+    # record a finished run
+    def record(self, map_name, elapsed_time):
+        with self.connection:
+            self.connection.execute("INSERT INTO runs (map, time) VALUES (?, ?)", (map_name, elapsed_time))
+
+        # keep the cached top times in step without another query
+        top_times = self.top_times.get(map_name)
+        if top_times is not None:
+            bisect.insort(top_times, elapsed_time)
+            del top_times[self.top_count:]
+
+    # return the best times for a map, fastest first
+    def top(self, map_name):
+        top_times = self.top_times.get(map_name)
+        if top_times is None:
+            rows = self.connection.execute("SELECT time FROM runs WHERE map = ? ORDER BY time LIMIT ?", (map_name, self.top_count))
+            top_times = [row[0] for row in rows]
+            self.top_times[map_name] = top_times
+        return list(top_times)
+
+    # import a times.txt file once, every line is a time in milliseconds
+    def import_times_file(self, path, map_name):
+        source = "{}:{}".format(os.path.basename(path), map_name)
+        if not os.path.exists(path) or self.connection.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+            return 0
+
+        with open(path, "r") as file:
+            times = [float(line.strip()) for line in file if line.strip()]
+
+        # runs and the import marker are written in one transaction
+        with self.connection:
+            self.connection.executemany("INSERT INTO runs (map, time) VALUES (?, ?)", [(map_name, time) for time in times])
+            self.connection.execute("INSERT INTO imports (source) VALUES (?)", (source,))
+        self.top_times.pop(map_name, None)
+        return len(times)
+
+    # close the database
+    def close(self):
+        self.connection.close()
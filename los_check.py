@@ -0,0 +1,79 @@
+# importing modules
+import sys
+import time
+import random
+import argparse
+import pygame
+from settings import *
+from engine import TileMap
+
+# the per-pixel ray march that the tile walk in TileMap.has_line_of_sight replaced, kept as the reference it must agree with
+# steps one pixel at a time from start towards end and is blocked by the first sample inside a wall tile
+def reference_line_of_sight(wall_rows, start, end):
+    ray_cast = pygame.math.Vector2(end) - pygame.math.Vector2(start)
+    for i in range(int(ray_cast.length())):
+        current_tile = pygame.math.Vector2(start) + ray_cast.normalize() * i
+        tile_x = int(current_tile.x // TILE_SIZE)
+        tile_y = int(current_tile.y // TILE_SIZE)
+        if 0 <= tile_y < len(wall_rows) and 0 <= tile_x < len(wall_rows[0]) and wall_rows[tile_y][tile_x]:
+            return False
+    return True
+
+# random pairs of points on the map, anywhere, on tile edges and centres where rays graze corners, and short rays along the axes and diagonals
+def sample_pairs(tile_map, count, seed):
+    rng = random.Random(seed)
+    width = tile_map.width * TILE_SIZE
+    height = tile_map.height * TILE_SIZE
+    offsets = (0, TILE_SIZE // 2, TILE_SIZE - 1)
+    pairs = []
+    for i in range(count):
+        if i % 3 == 0:
+            pairs.append(((rng.randrange(width), rng.randrange(height)), (rng.randrange(width), rng.randrange(height))))
+        elif i % 3 == 1:
+            pairs.append(tuple((rng.randrange(tile_map.width) * TILE_SIZE + rng.choice(offsets),
+                                rng.randrange(tile_map.height) * TILE_SIZE + rng.choice(offsets)) for _ in range(2)))
+        else:
+            start = (rng.randrange(width), rng.randrange(height))
+            distance = rng.randrange(1, 8 * TILE_SIZE)
+            pairs.append((start, (start[0] + rng.choice((-distance, 0, distance)), start[1] + rng.choice((-distance, 0, distance, distance // 2)))))
+    return pairs
+
+# compare the tile walk and the indexed check against the reference, returns the pairs each one got wrong
+def compare(tile_map, pairs):
+    wall_rows = tile_map.wall_rows()
+    mismatches = {"has_line_of_sight": [], "can_see": []}
+    for start, end in pairs:
+        expected = reference_line_of_sight(wall_rows, start, end)
+        if tile_map.has_line_of_sight(start, end) != expected:
+            mismatches["has_line_of_sight"].append((start, end, expected))
+        if tile_map.can_see(start, end) != expected:
+            mismatches["can_see"].append((start, end, expected))
+    return mismatches
+
+# check line of sight on maps against the reference from the command line
+def main():
+    parser = argparse.ArgumentParser(description="compare line of sight and the visibility index against the per-pixel reference")
+    parser.add_argument("maps", nargs="*", default=[MAP_FILENAME])
+    parser.add_argument("--samples", type=int, default=20000, help="point pairs to check on each map")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show", type=int, default=10, help="mismatches to list for each check")
+    args = parser.parse_args()
+
+    failed = False
+    for map_filename in args.maps:
+        tile_map = TileMap(map_filename)
+        if tile_map.visibility is not None:
+            print(tile_map.visibility.report())
+
+        start = time.perf_counter()
+        mismatches = compare(tile_map, sample_pairs(tile_map, args.samples, args.seed))
+        print("{}: {} pairs in {:.1f}s, {}".format(map_filename, args.samples, time.perf_counter() - start,
+                                                  ", ".join("{} {} mismatches".format(name, len(found)) for name, found in mismatches.items())))
+        for name, found in mismatches.items():
+            for start_point, end_point, expected in found[:args.show]:
+                print("  {} {} -> {}: expected {}".format(name, start_point, end_point, expected))
+            failed = failed or bool(found)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
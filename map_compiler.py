@@ -0,0 +1,209 @@
+# importing modules
+import sys
+import time
+import struct
+import hashlib
+import argparse
+from settings import *
+
+# numpy is optional, it unpacks the wall bitmap
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# file layout: header, wall bitmap with rows padded to whole bytes, then spawn and exit tables as int32 tile pairs
+# the visibility index is cached on its own beside the map, compressed and keyed on its settings
+COMPILED_MAGIC = b"MAP1"
+COMPILED_VERSION = 1
+HEADER = struct.Struct("<4sHII20sIIIii")
+TILE_PAIR = struct.Struct("<ii")
+
+# tiles, spawns and exits of a level, spawn locations are in tiles
+class MapData:
+    def __init__(self, width, height, walls, enemy_spawns, player_spawns, exit_tiles, exit_tile, source_hash=b""):
+        self.width = width
+        self.height = height
+        self.walls = walls
+        self.enemy_spawns = enemy_spawns
+        self.player_spawns = player_spawns
+        self.exit_tiles = exit_tiles
+        self.exit_tile = exit_tile
+        self.source_hash = source_hash
+
+# parse the text format, a row ends at its first exit tile and rows that end early are floor past their end
+def parse_map_text(text, source_hash=b""):
+    map_data = [line.strip() for line in text.splitlines()]
+    width = len(map_data[0])
+    height = len(map_data)
+    walls = []
+    enemy_spawns = []
+    player_spawns = []
+    exit_tiles = []
+    exit_tile = None
+
+    for y, map_line in enumerate(map_data):
+        tile_row = []
+        for x, map_symbol in enumerate(map_line):
+            # wall tile if symbol is #
+            if map_symbol == "#":
+                tile_row.append(True)
+
+            # spawn enemy on tile if symbol is E
+            elif map_symbol == "E":
+                tile_row.append(False)
+                enemy_spawns.append((x, y))
+
+            # spawn player on tile if symbol is P
+            elif map_symbol == "P":
+                tile_row.append(False)
+                player_spawns.append((x, y))
+
+            # spawn exit tile if symbol is X
+            elif map_symbol == "X":
+                tile_row.append(True)
+                exit_tiles.append((x, y))
+                exit_tile = (x, y)
+                break
+
+            else:
+                tile_row.append(False)
+
+        # rows are cut or padded to the width of the first row
+        walls.append((tile_row + [False] * width)[:width])
+
+    return MapData(width, height, walls, enemy_spawns, player_spawns, exit_tiles, exit_tile, source_hash)
+
+# pack rows of wall flags into bytes, most significant bit first
+def pack_walls(walls, width):
+    row_bytes = (width + 7) // 8
+    packed = bytearray()
+    for row in walls:
+        bits = 0
+        for wall in row:
+            bits = bits << 1 | wall
+        packed += (bits << (row_bytes * 8 - width)).to_bytes(row_bytes, "big")
+    return bytes(packed)
+
+# unpack a wall bitmap into rows of wall flags
+def unpack_walls(data, width, height):
+    row_bytes = (width + 7) // 8
+    if np is not None:
+        bitmap = np.frombuffer(data, dtype=np.uint8, count=row_bytes * height).reshape(height, row_bytes)
+        return np.unpackbits(bitmap, axis=1)[:, :width].astype(bool).tolist()
+
+    shift = row_bytes * 8 - width
+    walls = []
+    for y in range(height):
+        bits = int.from_bytes(data[y * row_bytes:(y + 1) * row_bytes], "big") >> shift
+        walls.append([bool(bits >> (width - 1 - x) & 1) for x in range(width)])
+    return walls
+
+# build the binary form of a level
+def compile_map(level):
+    exit_x, exit_y = level.exit_tile if level.exit_tile is not None else (-1, -1)
+    parts = [HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, level.width, level.height, level.source_hash,
+                         len(level.enemy_spawns), len(level.player_spawns), len(level.exit_tiles), exit_x, exit_y),
+             pack_walls(level.walls, level.width)]
+    for table in (level.enemy_spawns, level.player_spawns, level.exit_tiles):
+        parts.extend(TILE_PAIR.pack(x, y) for x, y in table)
+    return b"".join(parts)
+
+# read a compiled level, returns None if it is not a compiled map, is cut short or padded, or was built from a different source
+def read_compiled(data, source_hash=None):
+    if len(data) < HEADER.size:
+        return None
+    magic, version, width, height, stored_hash, enemy_count, player_count, exit_count, exit_x, exit_y = HEADER.unpack_from(data)
+    if magic != COMPILED_MAGIC or version != COMPILED_VERSION or (source_hash is not None and stored_hash != source_hash):
+        return None
+    bitmap_size = (width + 7) // 8 * height
+    if len(data) != HEADER.size + bitmap_size + (enemy_count + player_count + exit_count) * TILE_PAIR.size:
+        return None
+
+    data = memoryview(data)
+    offset = HEADER.size
+    walls = unpack_walls(data[offset:offset + bitmap_size], width, height)
+    offset += bitmap_size
+
+    tables = []
+    for count in (enemy_count, player_count, exit_count):
+        tables.append([TILE_PAIR.unpack_from(data, offset + i * TILE_PAIR.size) for i in range(count)])
+        offset += count * TILE_PAIR.size
+
+    exit_tile = (exit_x, exit_y) if exit_x >= 0 else None
+    return MapData(width, height, walls, tables[0], tables[1], tables[2], exit_tile, stored_hash)
+
+# sha1 of a file read a piece at a time, the identity of a map for caches and replays
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for piece in iter(lambda: f.read(1 << 20), b""):
+            digest.update(piece)
+    return digest.digest()
+
+# read and parse a text map
+def load_map_text(map_filename, source_hash):
+    with open(map_filename, "rb") as f:
+        return parse_map_text(f.read().decode("utf-8"), source_hash)
+
+# load a level, compiling the text map and caching it beside the source when the cached copy is missing or stale
+def load_map(map_filename):
+    source_hash = file_hash(map_filename)
+    if not MAP_COMPILE:
+        return load_map_text(map_filename, source_hash)
+
+    compiled_path = map_filename + COMPILED_MAP_SUFFIX
+    try:
+        with open(compiled_path, "rb") as f:
+            level = read_compiled(f.read(), source_hash)
+        if level is not None:
+            return level
+    except OSError:
+        pass
+
+    level = load_map_text(map_filename, source_hash)
+    try:
+        with open(compiled_path, "wb") as f:
+            f.write(compile_map(level))
+    except OSError:
+        pass
+    return level
+
+# time loading a map from text against loading its compiled copy
+def benchmark_load(map_filename, repeats=20):
+    load_map(map_filename)
+    with open(map_filename, "rb") as f:
+        source = f.read()
+    with open(map_filename + COMPILED_MAP_SUFFIX, "rb") as f:
+        compiled = f.read()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse_map_text(source.decode("utf-8"))
+    text_time = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        read_compiled(compiled)
+    compiled_time = (time.perf_counter() - start) / repeats
+    return text_time, compiled_time, len(source), len(compiled)
+
+# compile maps and compare their load times from the command line
+def main():
+    parser = argparse.ArgumentParser(description="compile text maps into cached binary maps")
+    parser.add_argument("maps", nargs="*", default=[MAP_FILENAME])
+    parser.add_argument("--benchmark", action="store_true", help="compare text and compiled load times")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    for map_filename in args.maps:
+        if args.benchmark:
+            text_time, compiled_time, text_size, compiled_size = benchmark_load(map_filename, args.repeats)
+            print("{}: text {:.2f} ms ({} bytes), compiled {:.2f} ms ({} bytes), {:.1f}x faster".format(
+                map_filename, text_time * 1000, text_size, compiled_time * 1000, compiled_size, text_time / compiled_time))
+        else:
+            level = load_map(map_filename)
+            print("{}: {}x{} tiles, {} enemies, compiled to {}".format(map_filename, level.width, level.height, len(level.enemy_spawns), map_filename + COMPILED_MAP_SUFFIX))
+
+if __name__ == "__main__":
+    sys.exit(main())
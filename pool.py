@@ -0,0 +1,62 @@
+# what a pool can do once capacity entities are in play: make more anyway, reuse the oldest one in play, or refuse
+POOL_OVERFLOW_POLICIES = ("grow", "recycle", "drop")
+
+# entities of one type kept for reuse so firing and dropping weapons do not allocate
+# acquire resets a free entity and adds it to the pool's store, the store hands entities back as they are killed
+class EntityPool:
+    def __init__(self, store, factory, capacity, overflow="grow", evict=None):
+        if overflow not in POOL_OVERFLOW_POLICIES:
+            raise ValueError("unknown pool overflow policy {!r}, expected one of {}".format(overflow, ", ".join(POOL_OVERFLOW_POLICIES)))
+        self.store = store
+        self.factory = factory
+        self.capacity = capacity
+        self.overflow = overflow
+        self.free = []
+        store.pool = self
+
+        # takes the oldest entity out of play when the pool recycles, killing it is enough unless it is also on the map
+        self.evict = evict or (lambda entity: entity.kill())
+
+        # free entities reused, entities that had to be made, the most in play at once, and what overflowing cost
+        self.hits = 0
+        self.misses = 0
+        self.high_water = 0
+        self.recycled = 0
+        self.refused = 0
+
+    # return an entity set up with the given arguments and added to the store, None if the pool is full and refuses
+    def acquire(self, *args):
+        if len(self.store) >= self.capacity:
+            if self.overflow == "drop":
+                self.refused += 1
+                return None
+            if self.overflow == "recycle" and self.store:
+                self.evict(self.store.oldest())
+                self.recycled += 1
+
+        if self.free:
+            entity = self.free.pop()
+            entity.reset(*args)
+            self.hits += 1
+        else:
+            entity = self.factory(*args)
+            self.misses += 1
+        self.store.add(entity)
+        self.high_water = max(self.high_water, len(self.store))
+        return entity
+
+    # take back an entity that left the store, any past the capacity are left to the garbage collector
+    def release(self, entity):
+        if len(self.free) < self.capacity:
+            self.free.append(entity)
+
+    # counters as a dictionary for benchmark results
+    def stats(self):
+        return {"capacity": self.capacity, "overflow": self.overflow, "hits": self.hits, "misses": self.misses,
+                "high_water": self.high_water, "recycled": self.recycled, "refused": self.refused}
+
+    # describe how well the pool is reusing entities
+    def report(self, name="pool"):
+        requests = self.hits + self.misses
+        return "{}: {} hits, {} misses ({:.0%} reused), high water {} of {}, {} recycled, {} refused".format(
+            name, self.hits, self.misses, self.hits / requests if requests else 0, self.high_water, self.capacity, self.recycled, self.refused)
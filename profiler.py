@@ -0,0 +1,172 @@
+# importing modules
+import json
+import time
+from collections import deque
+import pygame
+from settings import *
+
+# section returned while the profiler is off, entering and leaving it does nothing
+class NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SECTION = NullSection()
+
+# times one named section and hands the result to the profiler
+class Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        # each section is listed under the section it first started in
+        stack = self.profiler.stack
+        self.profiler.phase_parents.setdefault(self.name, stack[-1] if stack else None)
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.profiler.stack.pop()
+        self.profiler.record(self.name, self.start, end)
+        return False
+
+# per frame timings of named sections, kept for a rolling window of frames and as trace events
+class Profiler:
+    def __init__(self, history=PROFILER_HISTORY, max_events=PROFILER_MAX_EVENTS):
+        self.enabled = False
+        self.frame_times = deque(maxlen=history)
+        self.phase_history = deque(maxlen=history)
+        self.events = deque(maxlen=max_events)
+        self.phase_parents = {}
+        self.current = {}
+        self.stack = []
+        self.frame_start = None
+        self.origin = time.perf_counter()
+
+        # functions wrapped while the profiler is on, as (owner, attribute, name, original)
+        self.instrumented = []
+
+    # return a context manager timing a section of the current frame
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        return Section(self, name)
+
+    # add the time spent in a section
+    def record(self, name, start, end):
+        self.current[name] = self.current.get(name, 0.0) + end - start
+        self.events.append((name, start, end - start))
+
+    # start timing a frame
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    # finish the frame started by begin_frame
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frame_times.append(end - self.frame_start)
+        self.phase_history.append(self.current)
+        self.events.append(("frame", self.frame_start, end - self.frame_start))
+        self.current = {}
+        self.frame_start = None
+
+    # time every call to a function or method, the wrapper is only installed while the profiler is on
+    def instrument(self, owner, attribute, name):
+        self.instrumented.append((owner, attribute, name, vars(owner)[attribute]))
+        if self.enabled:
+            setattr(owner, attribute, self.wrap(vars(owner)[attribute], name))
+
+    # return a function that runs the original inside a section
+    def wrap(self, function, name):
+        section = self.section
+
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    # switch the profiler on or off, clearing what was recorded before
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        self.frame_times.clear()
+        self.phase_history.clear()
+        self.current = {}
+        self.frame_start = None
+        for owner, attribute, name, original in self.instrumented:
+            setattr(owner, attribute, self.wrap(original, name) if enabled else original)
+
+    # average milliseconds per frame for every section with its nesting depth, each section followed by the ones inside it
+    def phase_averages(self):
+        frame_count = len(self.phase_history)
+        if frame_count == 0:
+            return []
+        totals = {}
+        for phases in self.phase_history:
+            for name, seconds in phases.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+
+        children = {}
+        for name, parent in self.phase_parents.items():
+            children.setdefault(parent, []).append(name)
+        averages = []
+        pending = [(name, 0) for name in reversed(children.get(None, []))]
+        while pending:
+            name, depth = pending.pop()
+            if name in totals:
+                averages.append((name, depth, totals[name] * 1000 / frame_count))
+            pending.extend((child, depth + 1) for child in reversed(children.get(name, [])))
+        return averages
+
+    # draw the frame time graph and the section breakdown
+    def draw_overlay(self, surface, font, x=20, y=120):
+        if not self.frame_times:
+            return
+
+        # one bar per frame, the line marks the time budget of a frame
+        graph_height = 100
+        scale = graph_height / (2000 / FPS)
+        panel = pygame.Rect(x, y, max(self.frame_times.maxlen, 360) + 20, graph_height + 20)
+        averages = self.phase_averages()
+        panel.height += 24 * (len(averages) + 1) + 10
+        overlay = pygame.Surface(panel.size, pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 170))
+        for i, frame_time in enumerate(self.frame_times):
+            bar = min(graph_height, int(frame_time * 1000 * scale))
+            colour = GREEN if frame_time * 1000 <= 1000 / FPS else RED
+            pygame.draw.line(overlay, colour, (10 + i, 10 + graph_height), (10 + i, 10 + graph_height - bar))
+        budget_y = 10 + graph_height - int(1000 / FPS * scale)
+        pygame.draw.line(overlay, WHITE, (10, budget_y), (panel.width - 10, budget_y))
+
+        # average time of each section, nested sections are indented under their callers
+        frame_average = sum(self.frame_times) * 1000 / len(self.frame_times)
+        text_y = graph_height + 20
+        overlay.blit(font.render("frame {:.2f} ms".format(frame_average), True, WHITE), (10, text_y))
+        for name, depth, milliseconds in averages:
+            text_y += 24
+            overlay.blit(font.render("{}{} {:.2f} ms".format("  " * depth, name, milliseconds), True, WHITE), (10, text_y))
+        surface.blit(overlay, panel.topleft)
+
+    # write the recorded sections as chrome trace events, nested sections show as a call stack
+    def export_chrome_trace(self, path):
+        events = [{"name": name, "cat": "frame" if name == "frame" else "game", "ph": "X", "pid": 1, "tid": 1,
+                   "ts": (start - self.origin) * 1e6, "dur": duration * 1e6}
+                  for name, start, duration in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+# profiler shared by the engine and the front end
+profiler = Profiler()
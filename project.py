@@ -1,161 +1,100 @@
 # importing modules
+import time
+
+# when this module started loading, the startup report measures from here
+STARTUP_START = time.perf_counter()
+
+import os
+import sys
+import argparse
+import threading
 import pygame
 from pygame.locals import *
 from sys import exit
-import math
-from random import randint
 from settings import *
-
-# initialise pygame
-pygame.init()
-
-# create window
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("game project")
-clock = pygame.time.Clock()
-
-# load images outside of the class to avoid reloading unnecessarily
-try:
-    player_image = pygame.transform.rotozoom(pygame.image.load("player/survivorrifle.png").convert_alpha(), 0, PLAYER_SIZE)
-    crosshair_image = pygame.transform.rotozoom(pygame.image.load("crosshair.png").convert_alpha(), 0, CROSSHAIR_SIZE)
-    kill_indicator_image = pygame.transform.rotozoom(pygame.image.load("kill_indicator.png").convert_alpha(), 0, KILL_INDICATOR_SIZE)
-    bullet_image = pygame.image.load("bullets/boolettrail.png").convert_alpha()
-    enemy_image = pygame.transform.rotozoom(pygame.image.load("enemy.png").convert_alpha(), 0, ENEMY_SIZE)
-    enemy_dead_image = pygame.transform.rotozoom(pygame.image.load("enemy_dead.png").convert_alpha(), 0, ENEMY_DEAD_SIZE)
-    drop_gun_image = pygame.transform.rotozoom(pygame.image.load("enemy_gun.png").convert_alpha(), 0, DROP_WEAPON_SIZE)
-except pygame.error as e:
-    print("Error loading images", e)
-    pygame.quit()
-    exit()
-
-# player class
-class Player(pygame.sprite.Sprite):
-    def __init__(self):
-        super().__init__()
-        self.image = player_image.copy()
-        self.pos = pygame.math.Vector2(PLAYERSTART_X, PLAYERSTART_Y*0.5)
-
-        # create copy of original, non-transformed image
-        self.default = self.image
-        self.hitbox_size = pygame.Vector2(80, 80)
-        self.hitbox_offset = pygame.Vector2(-self.hitbox_size.x // 2, -self.hitbox_size.y // 2)
-
-        # calculate hitbox rect
-        self.hitbox = pygame.Rect(self.pos.x + self.hitbox_offset.x, self.pos.y + self.hitbox_offset.y, self.hitbox_size.x, self.hitbox_size.y)
-        self.rect = self.hitbox.copy()
-        self.speed = PLAYER_SPEED
-        self.shoot = False
-        self.shoot_cooldown = 0
-        self.ammo = AMMO_COUNT
-        self.theta = 0
-
-    # detect user input
-    def user_input(self):
-        self.velocity_x = 0
-        self.velocity_y = 0
-
-        # check for key presses
-        keys = pygame.key.get_pressed()
-
-        if keys[pygame.K_w]:
-            self.velocity_y = -self.speed
-        if keys[pygame.K_a]:
-            self.velocity_x = -self.speed
-        if keys[pygame.K_s]:
-            self.velocity_y = self.speed
-        if keys[pygame.K_d]:
-            self.velocity_x = self.speed
-
-        # check for diagonal movement
-        if self.velocity_x != 0 and self.velocity_y != 0:
-            self.velocity_x /= math.sqrt(2)
-            self.velocity_y /= math.sqrt(2)
-
-        # check for mouse button presses
-        if pygame.mouse.get_pressed() == (1, 0, 0):
-            self.shoot = True
-            self.is_shooting()
-        else:
-            self.shoot = False
-
-    # move character
-    def move(self):
-        # save current position
-        self.original_pos = self.pos.copy()
-
-        # move player
-        self.pos += pygame.math.Vector2(self.velocity_x, self.velocity_y)
-        self.hitbox.center = self.pos
-        self.rect.center = self.hitbox.center
-
-        # check if player is moving into a wall
-        if tile_map.is_wall(self.rect.centerx, self.rect.centery):
-            self.pos = self.original_pos
-            self.hitbox.center = self.pos
-            self.rect.center = self.hitbox.center
-
-    # point player sprite in direction of mouse pointer
-    def aim(self):
-        self.mouse_pos = pygame.mouse.get_pos()
-        self.direction = pygame.math.Vector2(self.mouse_pos[0] - SCREEN_WIDTH // 2, self.mouse_pos[1] - SCREEN_HEIGHT // 2)
-        self.theta = math.degrees(math.atan2(self.direction.y, self.direction.x))
-        self.image = pygame.transform.rotate(self.default, -self.theta)
-        self.rect = self.image.get_rect(center = self.hitbox.center)
-
-    # refresh shooting cooldown
-    def is_shooting(self):
-        if self.shoot_cooldown == 0 and self.shoot and self.ammo > 0:
-            self.shoot_cooldown = SHOOT_COOLDOWN
-            self.create_bullet()
-
-            # change ammo counter
-            self.ammo -= 1
-
-    # instantiate a bullet
-    def create_bullet(self):
-        self.gun_offset = pygame.math.Vector2(GUN_OFFSET_X, GUN_OFFSET_Y)
-        self.rotated_gun_offset = self.gun_offset.rotate(self.theta)
-        bullet_pos = self.pos + self.rotated_gun_offset
-        bullet_rect = bullet_image.get_rect(center=(bullet_pos.x, bullet_pos.y))
-
-        if not tile_map.is_wall(bullet_rect.centerx, bullet_rect.centery):
-            self.bullet = Bullet(bullet_pos.x, bullet_pos.y, self.theta, bullet_image, source="player")
-
-            # add bullet to all sprites and bullet group
-            all_sprites_group.add(self.bullet)
-            bullet_group.add(self.bullet)
-
-    # check for collision between player and gun drop
-    def ammo_pickup(self):
-        collisions = pygame.sprite.spritecollide(self, drops_group, True)
-        for weapon in collisions:
-            self.ammo = AMMO_COUNT
-
-    # display ammo counter with outline
-    def ammo_counter(self):
-        outline_text(72, "Ammo: {}".format(self.ammo), 130, SCREEN_HEIGHT - 35)
-
-    # draw player hitbox for debugging
-    def draw_hitbox(self, surface, camera_offset):
-        adjusted_hitbox = self.hitbox.move(-camera_offset[0], -camera_offset[1])
-        pygame.draw.rect(surface, RED, adjusted_hitbox, 2)
-
-    # update player
-    def update(self):
-        self.user_input()
-        self.move()
-        self.aim()
-        self.ammo_pickup()
-        self.ammo_counter()
-
-        # reduce time before next shot each tick
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
+from text_renderer import TextRenderer
+from leaderboard import Leaderboard
+from engine import Game, PlayerInput, Bullet, TileMap
+from replay import ReplayRecorder
+from assets import load_atlas
+from profiler import profiler
+
+# the window, game and leaderboard are created in main() so this module can be imported without a display
+screen = None
+clock = None
+text_renderer = None
+game = None
+camera = None
+crosshair = None
+leaderboard = None
+recorder = None
+game_paused = False
+game_loader = None
+startup_timer = None
+
+# time spent in each step of starting up, printed with --startup-report
+class StartupTimer:
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.phases = []
+        self.reported = False
+
+    # record the time since the previous mark under a name
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    # one line per step and the time to the first frame
+    def report(self):
+        lines = ["startup: {:<14} {:7.1f} ms".format(name, seconds * 1000) for name, seconds in self.phases]
+        lines.append("startup: {:<14} {:7.1f} ms".format("first frame", (self.last - self.start) * 1000))
+        return "\n".join(lines)
+
+# record a startup step when the report is on
+def mark_startup(name):
+    if startup_timer is not None:
+        startup_timer.mark(name)
+
+# builds the game on a background thread while the menu waits, so the menu shows before the level is loaded
+class GameLoader:
+    def __init__(self, map_filename):
+        self.map_filename = map_filename
+        self.game = None
+        self.error = None
+        self.load_time = None
+        self.thread = threading.Thread(target=self.load, daemon=True)
+
+    # start loading in the background
+    def start(self):
+        if not self.thread.is_alive() and self.load_time is None:
+            self.thread.start()
+
+    # load the map, images and enemies
+    def load(self):
+        start = time.perf_counter()
+        try:
+            self.game = Game(self.map_filename)
+        except Exception as e:
+            self.error = e
+        self.load_time = time.perf_counter() - start
+
+    # return the game, waiting for the background load or loading it here if it never started
+    def result(self):
+        if self.thread.is_alive():
+            self.thread.join()
+        elif self.load_time is None:
+            self.load()
+        if self.error is not None:
+            raise self.error
+        return self.game
 
 # crosshair class
 class Crosshair(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, crosshair_image, kill_indicator_image):
         super().__init__()
+        self.crosshair_image = crosshair_image
         self.image = crosshair_image.copy()
         self.kill_indicator_image = kill_indicator_image.copy()
         self.rect = self.image.get_rect()
@@ -164,7 +103,7 @@ class Crosshair(pygame.sprite.Sprite):
     # show kill indicator when enemy is killed
     def show_kill_indicator(self):
         self.image = self.kill_indicator_image
-        
+
     # update crosshair
     def update(self):
         self.rect.center = pygame.mouse.get_pos()
@@ -172,201 +111,7 @@ class Crosshair(pygame.sprite.Sprite):
             self.lifespan -= 1
             if self.lifespan <= 0:
                 self.lifespan = 10
-                self.image = crosshair_image.copy()
-
-# bullet class
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, x ,y, theta, image, source):
-        super().__init__()
-        self.image = pygame.transform.rotozoom(image, -theta, BULLET_SIZE)
-        self.rect = self.image.get_rect(center=(x, y))
-        self.pos = pygame.Vector2(x, y)
-        self.theta = theta
-        self.speed = BULLET_SPEED
-        self.lifetime = BULLET_LIFETIME
-        self.spawn_time = pygame.time.get_ticks()
-        self.source = source
-
-    # spawn bullet with random factor
-    def spawn(self):
-        self.random_factor = randint(-BULLET_SPREAD, BULLET_SPREAD)
-        self.velocity = pygame.Vector2(math.cos(math.radians(self.theta + self.random_factor)), math.sin(math.radians(self.theta + self.random_factor))) * self.speed
-
-    # bullet movement
-    def bullet_move(self):
-        self.current_time = pygame.time.get_ticks()
-        self.pos += self.velocity
-        self.rect.center = self.pos
-
-        if pygame.time.get_ticks() - self.spawn_time > self.lifetime:
-            self.kill()
-
-    # check for collision with wall
-    def check_wall_collision(self):
-       if tile_map.is_wall(self.rect.centerx, self.rect.centery):
-           self.kill()
-
-    # check for collision with enemies
-    def check_enemy_collision(self, sprite):
-        if self.source == "player" and isinstance(sprite, Enemy) and not sprite.is_dead:
-            if self.rect.colliderect(sprite.hitbox):
-                sprite.die()
-                self.kill()
-
-    # check for collision with player
-    def check_player_collision(self, player):
-        if self.source == "enemy" and isinstance(player, Player):
-            if self.rect.colliderect(player.hitbox):
-                player.kill()
-                self.kill()
-
-    # update bullet
-    def update(self):
-        self.spawn()
-        self.bullet_move()
-
-        # check for collision with wall
-        self.check_wall_collision()
-
-        # check for collision with enemies
-        self.collisions = pygame.sprite.spritecollide(self, all_sprites_group, False, pygame.sprite.collide_rect)
-        for collision_sprite in self.collisions:
-            if collision_sprite != self:
-                if isinstance(collision_sprite, (Player)):
-                    self.check_player_collision(collision_sprite)
-                elif isinstance(collision_sprite, Enemy):
-                    self.check_enemy_collision(collision_sprite)
-
-# dropped weapon class
-class DroppedWeapon(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = drop_gun_image.copy()
-        self.rect = self.image.get_rect(center=(x, y))
-
-    def update(self):
-        pass
-
-# enemy class
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, spawn_location):
-        super().__init__()
-        self.image = enemy_image.copy()
-        self.pos = pygame.math.Vector2(spawn_location)
-
-        # create copy of original, non-transformed image
-        self.default = self.image
-        self.hitbox = self.default.get_rect(center = self.pos)
-        self.rect = self.hitbox.copy()
-        self.speed = ENEMY_SPEED
-        self.enemy_theta = 0
-        self.reaction_time = ENEMY_REACTION_TIME
-        self.enemy_shoot_cooldown = 0
-        self.is_dead = False
-
-    # move enemy
-    def move(self):
-        # save current position
-        self.original_pos = self.pos.copy()
-
-        self.direction = player.pos - self.pos
-        self.distance = self.direction.length()
-
-        # # check for zero division error
-        # if self.distance > 0:
-        #     self.direction.normalize_ip()
-        #     self.pos += self.direction * min(self.distance, self.speed)
-
-        #     # redefine the enemy rect
-        #     self.rect.center = (int(self.pos.x), int(self.pos.y))
-        #     self.hitbox.center = self.rect.center
-
-        #     # check for wall collision
-        #     if tile_map.is_wall(self.rect.centerx, self.rect.centery):
-        #         self.pos = self.original_pos
-        #         self.hitbox.center = self.pos
-        #         self.rect.center = self.hitbox.center
-
-    # aim enemy
-    def aim(self):
-        self.enemy_theta = self.direction.angle_to(pygame.math.Vector2(1, 0))
-        self.image = pygame.transform.rotate(self.default, self.enemy_theta)
-        self.rect = self.image.get_rect(center = self.hitbox.center)
-
-    # enemy shooting logic
-    def shoot(self):
-        if self.enemy_shoot_cooldown == 0:
-            self.enemy_shoot_cooldown = ENEMY_SHOOT_COOLDOWN
-            self.create_bullet()
-
-    # create bullet
-    def create_bullet(self):
-        self.enemy_theta = math.atan2(self.direction.y, self.direction.x)
-        self.bullet_pos = self.pos + pygame.math.Vector2(ENEMY_GUN_OFFSET_X, ENEMY_GUN_OFFSET_Y).rotate(math.degrees(self.enemy_theta))
-        bullet_rect = bullet_image.get_rect(center=(self.bullet_pos.x, self.bullet_pos.y))
-
-        if not tile_map.is_wall(bullet_rect.centerx, bullet_rect.centery):
-            # instantiate enemy bullet
-            self.bullet = Bullet(self.bullet_pos.x, self.bullet_pos.y, math.degrees(self.enemy_theta), bullet_image, source="enemy")
-            all_sprites_group.add(self.bullet)
-            bullet_group.add(self.bullet)
-
-    def has_line_of_sight(self, player_rect):
-        # calculate line segment between player and enemy rects
-        ray_cast = pygame.math.Vector2(player_rect.center) - pygame.math.Vector2(self.rect.center)
-
-        # iterate over tiles in line of sight and check for walls
-        for i in range(int(ray_cast.length())):
-            current_tile = pygame.math.Vector2(self.rect.center) + ray_cast.normalize() * i
-            tile_x = int(current_tile.x // TILE_SIZE)
-            tile_y = int(current_tile.y // TILE_SIZE)
-
-            # check if current tile is a wall
-            if 0 <= tile_y < len(tile_map.tile_data) and 0 <= tile_x < len(tile_map.tile_data[0]) and tile_map.tile_data[tile_y][tile_x]:
-                return False
-
-        return True
-
-    # swap to dead sprite and remove collider
-    def die(self):
-        self.is_dead = True
-        self.image = pygame.transform.rotate(enemy_dead_image, -self.enemy_theta)
-        self.hitbox = pygame.Rect(0, 0, 0, 0)
-        enemy_group.remove(self)
-        crosshair.show_kill_indicator()
-
-        # probability for enemy to drop a gun
-        if randint(1, 100) <= DROP_CHANCE:
-            dropped_weapon = DroppedWeapon(self.pos.x, self.pos.y)
-            all_sprites_group.add(dropped_weapon)
-            drops_group.add(dropped_weapon)
-
-    # draw hitbox for debugging
-    def draw_hitbox(self, surface, camera_offset):
-        drawn_hitbox = self.hitbox.move(-camera_offset[0], -camera_offset[1])
-        pygame.draw.rect(surface, RED, drawn_hitbox, 2)
-
-    # update enemy
-    def update(self):
-        if not self.is_dead:
-            # self.draw_hitbox(screen, camera.offset)
-            self.move()
-            los_result = self.has_line_of_sight(player.rect)
-
-            # if enemy has line of sight to the player
-            if los_result:
-                self.reaction_time -= 1
-                if self.reaction_time <= 0:
-                    self.aim()
-                    self.shoot()
-            
-            # otherwise refresh reaction time
-            else:
-                self.reaction_time = ENEMY_REACTION_TIME
-
-            # reduce cooldown
-            if self.enemy_shoot_cooldown > 0:
-                self.enemy_shoot_cooldown -= 1
+                self.image = self.crosshair_image.copy()
 
 # camera class
 class Camera(pygame.sprite.Group):
@@ -374,9 +119,11 @@ class Camera(pygame.sprite.Group):
         super().__init__()
         self.offset = pygame.math.Vector2()
         self.tile_map = tile_map
+        self.drawn_count = 0
+        self.culled_count = 0
 
     # move camera
-    def move_camera(self):
+    def move_camera(self, player):
         target_x = player.rect.centerx - SCREEN_WIDTH / 2
         target_y = player.rect.centery - SCREEN_HEIGHT / 2
 
@@ -386,130 +133,102 @@ class Camera(pygame.sprite.Group):
     def draw(self, surface):
         self.tile_map.draw(surface, position=(-self.offset.x, -self.offset.y))
 
-# tile map class
-class TileMap(pygame.sprite.Sprite):
-    def __init__(self, map_filename):
-        super().__init__()
+    # draw sprites that overlap the viewport and count the ones skipped
+    def draw_sprites(self, surface, sprites):
+        view_rect = pygame.Rect(int(self.offset.x), int(self.offset.y), surface.get_width(), surface.get_height())
+        self.drawn_count = 0
+        self.culled_count = 0
+        for sprite in sprites:
+            if view_rect.colliderect(sprite.rect):
+                surface.blit(sprite.image, sprite.rect.topleft - self.offset)
+                self.drawn_count += 1
+            else:
+                self.culled_count += 1
 
-        # open and read data from map file
-        with open(map_filename, "r") as f:
-            map_data = []
-            for line in f.readlines():
-                map_data.append(line.strip())
+# draw the map, sprites, bullets and player around the player
+def draw_world(surface, camera, game):
+    # move camera and draw map
+    camera.move_camera(game.player)
+    camera.draw(surface)
 
-        # calculate map width and length
-        map_width = len(map_data[0])
-        map_length = len(map_data)
+    with profiler.section("sprite blits"):
+        # draw other sprites inside the viewport
+        player = game.player
+        camera.draw_sprites(surface, game.drawn_entities())
 
-        # create surface to hold tiles
-        self.image = pygame.Surface((map_width * TILE_SIZE, map_length * TILE_SIZE))
-        self.rect = self.image.get_rect()
+        # draw array based bullets
+        if game.bullet_engine:
+            game.bullet_engine.draw(surface, camera.offset)
 
-        self.tile_data = []
-        self.enemy_spawn_locations = []
-        self.player_spawn_location = []
-
-        # iterate through map data
-        for y, map_line in enumerate(map_data):
-            tile_row = []
-            for x, map_symbol in enumerate(map_line):
-                tile_rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-
-                # draw green tile if symbol is #
-                if map_symbol == "#":
-                    pygame.draw.rect(self.image, GREEN, tile_rect)
-                    tile_row.append(True)
-
-                # spawn enemy on tile if symbol is E
-                elif map_symbol == "E":
-                    tile_row.append(False)  
-                    self.enemy_spawn_locations.append((x * TILE_SIZE, y * TILE_SIZE))
-
-                # spawn player on tile if symbol is P
-                elif map_symbol == "P":
-                    tile_row.append(False)
-                    self.player_spawn_location.append((x * TILE_SIZE, y * TILE_SIZE))
-
-                # spawn exit tile if symbol is X
-                elif map_symbol == "X":
-                    pygame.draw.rect(self.image, RED, tile_rect)
-                    tile_row.append(True)
-                    self.exit_tile_location = (x * TILE_SIZE, y * TILE_SIZE)
-                    break
-
-                else:
-                    tile_row.append(False)
-            self.tile_data.append(tile_row)
-                
-    # check if tile is within range and if type is a wall
-    def is_wall(self, x, y):
-        tile_x = int(x // TILE_SIZE)
-        tile_y = int(y // TILE_SIZE)
-
-        # return true if wall, false if not
-        return 0 <= tile_y < len(self.tile_data) and 0 <= tile_x < len(self.tile_data[0]) and self.tile_data[tile_y][tile_x]#
-    
-    # return enemy spawn locations
-    def get_enemy_spawn_locations(self):
-        return self.enemy_spawn_locations
-
-    # draw the map
-    def draw(self, surface, position=(0,0)):
-        self.rect.topleft = position
-        surface.blit(self.image, self.rect)
-
-start_time = 0
-
-# restart game after death
+        # draw player at the center of the screen
+        offset_pos = player.rect.topleft - camera.offset
+        surface.blit(player.image, offset_pos)
+
+    # draw hitboxes for testing and debugging
+    # player.draw_hitbox(surface, camera.offset)
+
+# take the loaded game the first time one starts and set up the camera and crosshair for it
+def ensure_game():
+    global game, camera, crosshair
+    if game is not None:
+        return
+
+    try:
+        wait_start = time.perf_counter()
+        game = game_loader.result()
+        atlas = load_atlas()
+        crosshair = Crosshair(atlas.images["crosshair"], atlas.images["kill_indicator"])
+    except pygame.error as e:
+        print("Error loading images", e)
+        pygame.quit()
+        exit()
+    if game.tile_map.report():
+        print(game.tile_map.report())
+    if startup_timer is not None:
+        print("startup: level loaded in {:.1f} ms, start waited {:.1f} ms".format(game_loader.load_time * 1000, (time.perf_counter() - wait_start) * 1000))
+    camera = Camera(game.tile_map)
+
+# show the startup report once the first menu frame is on screen and start loading the level behind the menu
+def finish_startup():
+    if startup_timer is not None and not startup_timer.reported:
+        mark_startup("menu")
+        print(startup_timer.report())
+        startup_timer.reported = True
+    game_loader.start()
+
+# restart game after death, the previous run is saved as a replay
 def new_game():
-    global player, enemy, game_paused, start_time
+    global game_paused, recorder
+    save_replay()
     game_paused = False
-
-    # kill all relevant sprites
-    for i in all_sprites_group:
-        i.kill()
-
-    # empty all relevant sprite groups
-    all_sprites_group.empty()
-    enemy_group.empty()
-    bullet_group.empty()
-
-    start_time = pygame.time.get_ticks()
-
-    # respawn all relevant sprites at initial positions
-    player = Player()
-    all_sprites_group.add(player)
-    if tile_map.player_spawn_location:
-        player.pos = pygame.math.Vector2(tile_map.player_spawn_location[0])
-
-    enemy_spawn_locations = tile_map.get_enemy_spawn_locations()
-    enemy = [Enemy(spawn_location) for spawn_location in enemy_spawn_locations]
-    for i in enemy:
-        enemy_group.add(enemy)
-        all_sprites_group.add(enemy)
+    game.new_game()
+    if RECORD_REPLAYS:
+        recorder = ReplayRecorder(game)
+
+# save the run being recorded, if it lasted at least one tick
+def save_replay():
+    global recorder
+    if recorder is not None and recorder.tick_count:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        recorder.save(os.path.join(REPLAY_DIR, "{}-{}.rpl".format(time.strftime("%Y%m%d-%H%M%S"), recorder.seed)))
+    recorder = None
+
+# save the current replay and close the game
+def quit_game():
+    save_replay()
+    pygame.quit()
+    exit()
 
 # draw timer with outline
 def draw_timer(elapsed_time):
-    outline_text(72, "{:.2f}".format(elapsed_time / 1000), SCREEN_WIDTH // 2, 50)
+    text_renderer.draw_glyphs(screen, 72, "{:.2f}".format(elapsed_time / 1000), SCREEN_WIDTH // 2, 50)
 
 # outline text
 def outline_text(font_size, content, x, y):
-    font = pygame.font.SysFont(None, font_size)
-
-    text_surface = font.render(content, True, (BLACK))
-
-    offsets = [(-1, -1), (1, -1), (-1, 1), (1, 1)]
-
-    for offset in offsets:
-        text_rect = text_surface.get_rect(center=(x + offset[0], y + offset[1]))
-        screen.blit(text_surface, text_rect)
-
-    text_surface = font.render(content, True, (WHITE))
-    text_rect = text_surface.get_rect(center=(x, y))
-    screen.blit(text_surface, text_rect)
+    text_renderer.draw_outlined(screen, font_size, content, x, y)
 
 # controls screen
-def controls_screen(screen):
+def controls_screen():
     font = pygame.font.Font(None, 56)
     controls_text = [
         "Controls:",
@@ -517,6 +236,7 @@ def controls_screen(screen):
         "Shoot - LMB",
         "Restart - R",
         "Exit to menu - Esc",
+        "Profiler - F3, save trace - F4",
 
         "",
         "Aim:",
@@ -533,255 +253,328 @@ def controls_screen(screen):
         "Don't forget:",
         "You die in 1 hit... but so do the enemies!",
     ]
-    screen.fill(BLACK)
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(BLACK)
     text_y = 50
     for line in controls_text:
         text_surface = font.render(line, True, WHITE)
-        screen.blit(text_surface, (50, text_y))
+        surface.blit(text_surface, (50, text_y))
         text_y += 50
 
-    pygame.display.update()
+    return surface
+
+# block until something happens so idle screens do not redraw every frame
+def wait_for_events():
+    events = [pygame.event.wait()]
+    events.extend(pygame.event.get())
+    return events
+
+# check if the window needs repainting after being covered or restored
+def is_expose_event(event):
+    return event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED)
+
+# end screen button
+end_button_rect = pygame.Rect((SCREEN_WIDTH - BUTTON_WIDTH) // 2, (SCREEN_HEIGHT + 100) // 2, BUTTON_WIDTH, BUTTON_HEIGHT)
+
+# draw the end screen
+def render_end_screen(elapsed_time):
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(BLACK)
+
+    # display end screen message
+    font = pygame.font.SysFont(None, 40)
+    text_surface = font.render("Stage Completed", True, WHITE)
+    text_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
+    surface.blit(text_surface, text_rect)
+
+    # display time to 2 decimal places
+    time_text = "Your time: {:.2f} seconds".format(elapsed_time / 1000)
+    time_surface = font.render(time_text, True, WHITE)
+    time_rect = time_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+    surface.blit(time_surface, time_rect)
+
+    # display button to return to menu
+    pygame.draw.rect(surface, GREEN, end_button_rect)
+    button_text = font.render("Main Menu", True, WHITE)
+    button_text_rect = button_text.get_rect(center=end_button_rect.center)
+    surface.blit(button_text, button_text_rect)
+
+    return surface
 
 # display end screen
 def end_screen(elapsed_time):
+    pygame.mouse.set_visible(True)
+    end_surface = render_end_screen(elapsed_time)
+    redraw = True
+
     while True:
-        for event in pygame.event.get():
+        if redraw:
+            screen.blit(end_surface, (0, 0))
+            pygame.display.update()
+            redraw = False
+
+        for event in wait_for_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                quit_game()
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if button_rect.collidepoint(event.pos):
+                if end_button_rect.collidepoint(event.pos):
                     record_time(elapsed_time)
                     return False
+            elif is_expose_event(event):
+                redraw = True
 
-        # clear the screen
-        screen.fill(BLACK)
-
-        # display end screen message
-        pygame.mouse.set_visible(True)
-        font = pygame.font.SysFont(None, 40)
-        text_surface = font.render("Stage Completed", True, WHITE)
-        text_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
-        screen.blit(text_surface, text_rect)
-
-        # display time to 2 decimal places
-        time_text = "Your time: {:.2f} seconds".format(elapsed_time / 1000)
-        time_surface = font.render(time_text, True, WHITE)
-        time_rect = time_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-        screen.blit(time_surface, time_rect)
-
-        # display button to return to menu
-        button_rect = pygame.Rect((SCREEN_WIDTH - BUTTON_WIDTH) // 2, (SCREEN_HEIGHT + 100) // 2, BUTTON_WIDTH, BUTTON_HEIGHT)
-        pygame.draw.rect(screen, GREEN, button_rect)
-        button_text = font.render("Main Menu", True, WHITE)
-        button_text_rect = button_text.get_rect(center=button_rect.center)
-        screen.blit(button_text, button_text_rect)
-
-        pygame.display.update()
-
-# instantiate classes
-tile_map = TileMap("map1.txt")
-camera = Camera(tile_map)
-
-# spawn player at tilemap location
-player = Player()
-if tile_map.player_spawn_location:
-    player.pos = pygame.math.Vector2(tile_map.player_spawn_location[0])
-
-# create crosshair
-crosshair = Crosshair()
-
-# spawn enemies from the tilemap locations
-enemy_spawn_locations = tile_map.get_enemy_spawn_locations()
-enemy = [Enemy(spawn_location) for spawn_location in enemy_spawn_locations]
-
-# sprite groups and bullets group
-all_sprites_group = pygame.sprite.Group()
-enemy_group = pygame.sprite.Group()
-bullet_group = pygame.sprite.Group()
-crosshair_group = pygame.sprite.Group()
-tile_map_group = pygame.sprite.GroupSingle()
-drops_group = pygame.sprite.Group()
-
-# add sprites to groups
-for i in enemy:
-    enemy_group.add(enemy)
-    all_sprites_group.add(enemy)
-all_sprites_group.add(player)
-crosshair_group.add(crosshair)
-tile_map_group.add(tile_map)
-
-# record time to file
+
+# record time to the leaderboard
 def record_time(elapsed_time):
-    with open("times.txt", "a") as file:
-        file.write(str(elapsed_time) + "\n")
+    leaderboard.record(MAP_FILENAME, elapsed_time)
 
 # read top 5 times
 def read_top_times():
-    with open("times.txt", "r") as file:
-        lines = file.readlines()
-        top_times = [float(line.strip()) for line in lines]
-        top_times.sort()
-        return top_times[:5]
+    return leaderboard.top(MAP_FILENAME)
+
+# main menu buttons
+start_button_rect = pygame.Rect((SCREEN_WIDTH - BUTTON_WIDTH) // 2, (SCREEN_HEIGHT - BUTTON_HEIGHT) // 2, BUTTON_WIDTH, BUTTON_HEIGHT)
+controls_button_rect = start_button_rect.copy()
+controls_button_rect.y += BUTTON_HEIGHT + BUTTON_SPACING
+quit_button_rect = start_button_rect.copy()
+quit_button_rect.y += 2 * BUTTON_HEIGHT + 2 * BUTTON_SPACING
+
+# draw the main menu with the leaderboard
+def render_main_menu(top_times):
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    surface.fill(BLACK)
+
+    # draw start button
+    pygame.draw.rect(surface, (GREEN), start_button_rect)
+    font = pygame.font.Font(None, 36)
+    start_text = font.render("Start Game", True, (WHITE))
+    start_text_rect = start_text.get_rect(center=start_button_rect.center)
+    surface.blit(start_text, start_text_rect)
+
+    # draw controls button
+    pygame.draw.rect(surface, (GREEN), controls_button_rect)
+    controls_text = font.render("Controls", True, (WHITE))
+    controls_text_rect = controls_text.get_rect(center=controls_button_rect.center)
+    surface.blit(controls_text, controls_text_rect)
+
+    # draw quit button
+    pygame.draw.rect(surface, (GREEN), quit_button_rect)
+    quit_text = font.render("Quit", True, (WHITE))
+    quit_text_rect = quit_text.get_rect(center=quit_button_rect.center)
+    surface.blit(quit_text, quit_text_rect)
+
+    # display top 5 times
+    top_times_rect = pygame.Rect(50, (SCREEN_HEIGHT - 400) // 2, 200, 400)
+    pygame.draw.rect(surface, BLACK, top_times_rect)
+    font = pygame.font.Font(None, 28)
+    leaderboard_text = font.render("Top 5 Times", True, WHITE)
+    leaderboard_text_rect = leaderboard_text.get_rect(center=(top_times_rect.centerx, top_times_rect.y + 30))
+    surface.blit(leaderboard_text, leaderboard_text_rect)
+
+    if top_times:
+        text_y = leaderboard_text_rect.bottom + 20
+        for i, best_time in enumerate(top_times, start=1):
+            time_text = font.render(f"{i}. {best_time / 1000:.2f} seconds", True, WHITE)
+            time_text_rect = time_text.get_rect(center=(top_times_rect.centerx, text_y))
+            surface.blit(time_text, time_text_rect)
+            text_y += 30
+
+    return surface
+
+# controls page is drawn the first time it is opened
+controls_surface = None
 
 # main menu screen
 def main_menu():
+    global controls_surface
+    pygame.mouse.set_visible(True)
+
+    # read top 5 times from file once per visit to the menu
+    menu_surface = render_main_menu(read_top_times())
     show_controls = False
+    redraw = True
+
     while True:
-        for event in pygame.event.get():
+        if redraw:
+            if show_controls:
+                if controls_surface is None:
+                    controls_surface = controls_screen()
+                screen.blit(controls_surface, (0, 0))
+            else:
+                screen.blit(menu_surface, (0, 0))
+            pygame.display.update()
+            redraw = False
+            finish_startup()
+
+        for event in wait_for_events():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                quit_game()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if start_button_rect.collidepoint(event.pos):
                     pygame.time.delay(100)
+                    ensure_game()
                     new_game()
                     return True
                 elif controls_button_rect.collidepoint(event.pos):
                     show_controls = True
-                    pygame.display.update()
+                    redraw = True
                 elif quit_button_rect.collidepoint(event.pos):
-                    pygame.quit()
-                    exit()
+                    quit_game()
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
+                if event.key == pygame.K_ESCAPE and show_controls:
                     show_controls = False
+                    redraw = True
+            elif is_expose_event(event):
+                redraw = True
+
+# open the window and run the menus and the main game loop
+def main():
+    global screen, clock, text_renderer, leaderboard, game_paused, game_loader, startup_timer
+
+    parser = argparse.ArgumentParser(description="top down shooter")
+    parser.add_argument("--startup-report", action="store_true", help="print how long each step of starting up took")
+    args = parser.parse_args()
+    if args.startup_report:
+        startup_timer = StartupTimer(STARTUP_START)
+        mark_startup("imports")
+
+    # initialise only the display and fonts, audio and joysticks are never used
+    if FAST_STARTUP:
+        pygame.display.init()
+        pygame.font.init()
+    else:
+        pygame.init()
+    mark_startup("pygame init")
+
+    # create window
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("game project")
+    clock = pygame.time.Clock()
+    mark_startup("window")
+
+    # cached fonts and rendered text for the HUD
+    text_renderer = TextRenderer(TEXT_CACHE_SIZE)
+
+    # best times for each map, older times.txt runs are imported on first launch
+    leaderboard = Leaderboard(LEADERBOARD_PATH, 5)
+    leaderboard.import_times_file(LEGACY_TIMES_PATH, MAP_FILENAME)
+    mark_startup("leaderboard")
+
+    # the map, images and enemies are loaded behind the menu, or up front without fast startup
+    game_loader = GameLoader(MAP_FILENAME)
+    if not FAST_STARTUP:
+        ensure_game()
+        mark_startup("level")
+
+    # methods timed by the profiler, they are only wrapped while it is on
+    profiler.instrument(TileMap, "can_see", "TileMap.can_see")
+    profiler.instrument(TileMap, "has_line_of_sight", "TileMap.has_line_of_sight")
+    profiler.instrument(Bullet, "update", "Bullet.update")
+    profiler.instrument(Camera, "draw", "Camera.draw")
+    profiler.instrument(sys.modules[__name__], "outline_text", "outline_text")
+
+    if not main_menu():
+        quit_game()
+
+    crosshair_group = pygame.sprite.Group()
+    crosshair_group.add(crosshair)
+    kills_shown = game.kill_count
+
+    # real time waiting to be simulated in fixed ticks, in milliseconds
+    tick_time = 1000 / TICK_RATE
+    accumulator = 0.0
+    clock.tick()
+
+    # main game loop
+    while True:
+        profiler.begin_frame()
+        with profiler.section("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    quit_game()
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        if game_paused:
+                            game_paused = False
+                        elif not main_menu():
+                            quit_game()
+                        clock.tick()
+                    elif event.key == pygame.K_r and (game_paused or not game.player.alive()):
+                        # restart game
+                        new_game()
+                    elif event.key == pygame.K_F3:
+                        profiler.set_enabled(not profiler.enabled)
+                    elif event.key == pygame.K_F4:
+                        print("saved", profiler.export_chrome_trace(PROFILER_TRACE_PATH), "trace events to", PROFILER_TRACE_PATH)
+
+        # handle player alive and game running
+        if game.player.alive() and not game_paused:
+            pygame.mouse.set_visible(False)
+
+            # run as many fixed ticks as the time since the last frame covers, with the keyboard and mouse state
+            with profiler.section("frame wait"):
+                accumulator += clock.tick_busy_loop(FPS)
+            with profiler.section("input"):
+                player_input = PlayerInput.from_pygame()
+            ticks = 0
+            with profiler.section("simulation"):
+                while accumulator >= tick_time and ticks < MAX_TICKS_PER_FRAME and game.player.alive():
+                    if recorder is not None:
+                        recorder.step(player_input)
+                    else:
+                        game.step(player_input)
+                    accumulator -= tick_time
+                    ticks += 1
+
+            # drop the backlog if rendering has fallen too far behind, the game slows down instead of stalling
+            if ticks == MAX_TICKS_PER_FRAME:
+                accumulator = 0.0
+
+            # clear screen and draw the game
+            screen.fill(BLACK)
+            draw_world(screen, camera, game)
+
+            with profiler.section("hud"):
+                # draw timer and ammo counter
+                draw_timer(game.elapsed_time)
+                outline_text(72, "Ammo: {}".format(game.player.ammo), 130, SCREEN_HEIGHT - 35)
+
+                # flash the kill indicator for enemies killed this tick
+                if game.kill_count != kills_shown:
+                    kills_shown = game.kill_count
+                    crosshair.show_kill_indicator()
+
+                # draw crosshair
+                screen.blit(crosshair.image, crosshair.rect)
+                crosshair_group.update()
+
+            # frame time graph and breakdown of the previous frames
+            if profiler.enabled:
+                profiler.draw_overlay(screen, text_renderer.font(24))
+
+            # check if player has reached exit and all enemies are killed
+            if game.is_complete():
+                save_replay()
+
+                # return to main menu
+                if not end_screen(game.elapsed_time):
+                    main_menu()
+                clock.tick()
+
+            with profiler.section("display.update"):
+                pygame.display.update()
+            profiler.end_frame()
+
+        # handle player dead or game paused
+        else:
+            save_replay()
+            outline_text(40, "Press R to restart", SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+            pygame.display.update()
 
-        # configure window
-        screen.fill(BLACK)
-        pygame.mouse.set_visible(True)
-
-        # create start and quit buttons
-        start_button_rect = pygame.Rect((SCREEN_WIDTH - BUTTON_WIDTH) // 2, (SCREEN_HEIGHT - BUTTON_HEIGHT) // 2, BUTTON_WIDTH, BUTTON_HEIGHT)
-        controls_button_rect = start_button_rect.copy()
-        controls_button_rect.y += BUTTON_HEIGHT + BUTTON_SPACING
-        quit_button_rect = start_button_rect.copy()
-        quit_button_rect.y += 2 * BUTTON_HEIGHT + 2 * BUTTON_SPACING
-
-        # draw start button
-        pygame.draw.rect(screen, (GREEN), start_button_rect)
-        font = pygame.font.Font(None, 36)
-        start_text = font.render("Start Game", True, (WHITE))
-        start_text_rect = start_text.get_rect(center=start_button_rect.center)
-        screen.blit(start_text, start_text_rect)
-
-        # draw controls button
-        pygame.draw.rect(screen, (GREEN), controls_button_rect)
-        controls_text = font.render("Controls", True, (WHITE))
-        controls_text_rect = controls_text.get_rect(center=controls_button_rect.center)
-        screen.blit(controls_text, controls_text_rect)
-
-        # draw quit button
-        pygame.draw.rect(screen, (GREEN), quit_button_rect)
-        quit_text = font.render("Quit", True, (WHITE))
-        quit_text_rect = quit_text.get_rect(center=quit_button_rect.center)
-        screen.blit(quit_text, quit_text_rect)
-
-        # display top 5 times
-        top_times_rect = pygame.Rect(50, (SCREEN_HEIGHT - 400) // 2, 200, 400)
-        pygame.draw.rect(screen, BLACK, top_times_rect)
-        font = pygame.font.Font(None, 28)
-        leaderboard_text = font.render("Top 5 Times", True, WHITE)
-        leaderboard_text_rect = leaderboard_text.get_rect(center=(top_times_rect.centerx, top_times_rect.y + 30))
-        screen.blit(leaderboard_text, leaderboard_text_rect)
-
-        # read top 5 times from file
-        top_times = read_top_times()
-        if top_times:
-            text_y = leaderboard_text_rect.bottom + 20
-            for i, time in enumerate(top_times, start=1):
-                time_text = font.render(f"{i}. {time / 1000:.2f} seconds", True, WHITE)
-                time_text_rect = time_text.get_rect(center=(top_times_rect.centerx, text_y))
-                screen.blit(time_text, time_text_rect)
-                text_y += 30
-
-        if show_controls:
-            controls_screen(screen)
-
-        pygame.display.update()
-
-if not main_menu():
-    pygame.quit()
-    exit()
-
-# main game loop
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            exit()
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                if game_paused:
-                    game_paused = False
-                elif not main_menu():
-                    pygame.quit()
-                    exit()
-
-    keys = pygame.key.get_pressed()
-
-    # handle player alive and game running
-    if player.alive() and not game_paused:
-        pygame.mouse.set_visible(False)
-
-        # clear screen
-        screen.fill(BLACK)
-
-        # move camera and draw map
-        camera.move_camera()
-        camera.draw(screen)
-
-        # draw sprites
-        all_sprites_group.update()
-
-        # draw other sprites
-        for sprite in all_sprites_group:
-            if sprite != player:
-                offset_pos = sprite.rect.topleft - camera.offset
-                screen.blit(sprite.image, offset_pos)
-
-        # draw player at the center of the screen
-        offset_pos = player.rect.topleft - camera.offset
-        screen.blit(player.image, offset_pos)
-
-        # draw hitboxes for testing and debugging
-        # player.draw_hitbox(screen, camera.offset)
-
-        # update timer
-        current_time = pygame.time.get_ticks()
-        elapsed_time = current_time - start_time
-
-        # draw timer
-        draw_timer(elapsed_time)
-
-        # draw crosshair
-        screen.blit(crosshair.image, crosshair.rect)
-        crosshair_group.update()
-
-        # check if player has reached exit and all enemies are killed
-        if tile_map.exit_tile_location and player.rect.collidepoint(tile_map.exit_tile_location) and len(enemy_group) == 0:
-            # calculate elapsed time
-            elapsed_time = pygame.time.get_ticks() - start_time
-
-            # return to main menu
-            if not end_screen(elapsed_time):
-                main_menu()
-
-        pygame.display.update()
-        clock.tick_busy_loop(FPS)
+            # sleep until the next event, the event loop above handles restart and exit
+            pygame.event.post(pygame.event.wait())
+            clock.tick()
+            accumulator = 0.0
 
-    # handle player dead or game paused
-    else:
-        outline_text(40, "Press R to restart", SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-        pygame.display.update()
-
-        # check for key presses
-        if keys[pygame.K_r]:
-            # restart game
-            new_game()
-            game_paused = False
-        elif keys[pygame.K_ESCAPE]:
-            # return to main menu
-            if not main_menu():
-                pygame.quit()
-                exit()
+if __name__ == "__main__":
+    main()
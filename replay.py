@@ -0,0 +1,190 @@
+# importing modules
+import os
+import sys
+import time
+import zlib
+import struct
+import argparse
+import pygame
+from settings import *
+from engine import Game, PlayerInput, init_headless
+from map_compiler import file_hash
+
+# file layout: header, map name, one input record per tick, then one checksum every REPLAY_CHECKSUM_INTERVAL ticks
+REPLAY_MAGIC = b"RPL1"
+REPLAY_VERSION = 1
+HEADER = struct.Struct("<4sBQIH20sH")
+INPUT_RECORD = struct.Struct("<Bhh")
+CHECKSUM_RECORD = struct.Struct("<I")
+
+# bits of the input record's button byte
+INPUT_UP = 1
+INPUT_LEFT = 2
+INPUT_DOWN = 4
+INPUT_RIGHT = 8
+INPUT_SHOOT = 16
+
+# crc32 of everything that has to match for two runs to stay in step
+def state_checksum(game):
+    player = game.player
+    crc = zlib.crc32(struct.pack("<Iddi?I", game.tick_count - game.start_tick, player.pos.x, player.pos.y, player.ammo, player.alive(), len(game.enemies)))
+    for enemy in game.enemies:
+        crc = zlib.crc32(struct.pack("<dd", enemy.pos.x, enemy.pos.y), crc)
+    for bullet in game.bullets:
+        crc = zlib.crc32(struct.pack("<dd", bullet.pos.x, bullet.pos.y), crc)
+    if game.bullet_engine:
+        crc = zlib.crc32(game.bullet_engine.pos[:game.bullet_engine.count].tobytes(), crc)
+
+    # the generator state catches rolls that have not changed anything visible yet
+    rng_state = game.rng.getstate()[1]
+    return zlib.crc32(struct.pack("<{}I".format(len(rng_state)), *rng_state), crc)
+
+# pack one tick of input, the mouse position is rounded to whole pixels
+def pack_input(player_input):
+    buttons = ((INPUT_UP if player_input.up else 0) | (INPUT_LEFT if player_input.left else 0) | (INPUT_DOWN if player_input.down else 0)
+               | (INPUT_RIGHT if player_input.right else 0) | (INPUT_SHOOT if player_input.shoot else 0))
+    mouse_x = max(-32768, min(32767, int(round(player_input.mouse_pos[0]))))
+    mouse_y = max(-32768, min(32767, int(round(player_input.mouse_pos[1]))))
+    return INPUT_RECORD.pack(buttons, mouse_x, mouse_y)
+
+# unpack one tick of input
+def unpack_input(data, offset=0):
+    buttons, mouse_x, mouse_y = INPUT_RECORD.unpack_from(data, offset)
+    return PlayerInput(bool(buttons & INPUT_UP), bool(buttons & INPUT_LEFT), bool(buttons & INPUT_DOWN), bool(buttons & INPUT_RIGHT), bool(buttons & INPUT_SHOOT), (mouse_x, mouse_y))
+
+# records one run of a game, start it straight after new_game() and step the game through it
+class ReplayRecorder:
+    def __init__(self, game, checksum_interval=REPLAY_CHECKSUM_INTERVAL):
+        self.game = game
+        self.map_filename = game.map_filename
+        self.map_hash = file_hash(game.map_filename)
+        self.seed = game.run_seed
+        self.checksum_interval = checksum_interval
+        self.tick_count = 0
+        self.inputs = bytearray()
+        self.checksums = []
+
+    # record and apply one tick of input, the game sees the same rounded input a replay will
+    def step(self, player_input):
+        record = pack_input(player_input)
+        self.inputs += record
+        self.game.step(unpack_input(record))
+        self.tick_count += 1
+        if self.tick_count % self.checksum_interval == 0:
+            self.checksums.append(state_checksum(self.game))
+
+    # write the replay file
+    def save(self, path):
+        map_name = os.path.basename(self.map_filename).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.tick_count, self.checksum_interval, self.map_hash, len(map_name)))
+            f.write(map_name)
+            f.write(self.inputs)
+            for checksum in self.checksums:
+                f.write(CHECKSUM_RECORD.pack(checksum))
+
+# a loaded replay file
+class Replay:
+    def __init__(self, map_name, map_hash, seed, tick_count, checksum_interval, inputs, checksums):
+        self.map_name = map_name
+        self.map_hash = map_hash
+        self.seed = seed
+        self.tick_count = tick_count
+        self.checksum_interval = checksum_interval
+        self.inputs = inputs
+        self.checksums = checksums
+
+    # return the input recorded for a tick
+    def input_at(self, tick):
+        return unpack_input(self.inputs, tick * INPUT_RECORD.size)
+
+    # read a replay file
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, version, seed, tick_count, checksum_interval, map_digest, name_length = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("{} is not a version {} replay".format(path, REPLAY_VERSION))
+
+        offset = HEADER.size
+        map_name = data[offset:offset + name_length].decode("utf-8")
+        offset += name_length
+        inputs = data[offset:offset + tick_count * INPUT_RECORD.size]
+        offset += len(inputs)
+        checksums = [CHECKSUM_RECORD.unpack_from(data, offset + i * CHECKSUM_RECORD.size)[0] for i in range(tick_count // checksum_interval)]
+        return cls(map_name, map_digest, seed, tick_count, checksum_interval, inputs, checksums)
+
+# outcome of playing a replay back
+class PlaybackResult:
+    def __init__(self, ticks_played, divergence_tick, play_time):
+        self.ticks_played = ticks_played
+        self.divergence_tick = divergence_tick
+        self.play_time = play_time
+
+    # describe the playback speed and whether the run stayed in step
+    def report(self):
+        speed = self.ticks_played / self.play_time if self.play_time > 0 else 0
+        if self.divergence_tick is None:
+            result = "no divergence"
+        else:
+            result = "diverged by tick {}".format(self.divergence_tick)
+        return "replay: {} ticks in {:.2f}s ({:.0f} ticks/s), {}".format(self.ticks_played, self.play_time, speed, result)
+
+# play a replay through the game update, headless at full speed or rendered in real time
+# the divergence tick is the first checksummed tick that does not match, the state first differed at most one interval before it
+def play(replay, render=False, map_filename=None):
+    map_filename = map_filename or replay.map_name
+    # replays only play back on the exact map they were recorded on
+    if file_hash(map_filename) != replay.map_hash:
+        raise ValueError("{} has changed since the replay was recorded".format(map_filename))
+
+    if render:
+        # the front end draws the game the same way as when it was played
+        import project
+        pygame.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        clock = pygame.time.Clock()
+    else:
+        init_headless()
+
+    game = Game(map_filename)
+    game.new_game(replay.seed)
+    if render:
+        camera = project.Camera(game.tile_map)
+
+    divergence_tick = None
+    played = 0
+    start = time.perf_counter()
+    for tick in range(replay.tick_count):
+        game.step(replay.input_at(tick))
+
+        played = tick + 1
+        if played % replay.checksum_interval == 0 and divergence_tick is None:
+            if state_checksum(game) != replay.checksums[played // replay.checksum_interval - 1]:
+                divergence_tick = played
+
+        if render:
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            screen.fill(BLACK)
+            project.draw_world(screen, camera, game)
+            pygame.display.update()
+            clock.tick(TICK_RATE)
+
+    return PlaybackResult(played, divergence_tick, time.perf_counter() - start)
+
+# play a replay file from the command line
+def main():
+    parser = argparse.ArgumentParser(description="play back a recorded replay")
+    parser.add_argument("path")
+    parser.add_argument("--render", action="store_true", help="draw the replay in real time instead of running headless at full speed")
+    args = parser.parse_args()
+
+    result = play(Replay.load(args.path), render=args.render)
+    print(result.report())
+    return 0 if result.divergence_tick is None else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
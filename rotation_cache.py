@@ -0,0 +1,73 @@
+# importing modules
+import pygame
+from collections import OrderedDict
+from settings import *
+
+# shared cache of pre-rotated images, angles are quantised to a fixed step
+class RotationCache:
+    def __init__(self, step=ROTATION_STEP, max_bytes=ROTATION_CACHE_MAX_MB * 1024 * 1024):
+        self.step = step
+        self.frame_count = int(round(360 / step))
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+
+        # base images by name and rendered frames in least recently used order
+        self.images = {}
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # register a base image, smooth images use rotozoom and can be scaled
+    def add(self, name, image, scale=1, smooth=False):
+        self.images[name] = (image, scale, smooth)
+
+    # store frames rendered ahead of time for a registered image, one per frame index
+    def preload(self, name, frames):
+        for index, frame in enumerate(frames):
+            self.store((name, index), frame)
+
+    # return the frame index closest to an angle in degrees
+    def index(self, angle):
+        return int(round(angle / self.step)) % self.frame_count
+
+    # rotate a base image to a frame index
+    def render(self, name, index):
+        image, scale, smooth = self.images[name]
+        angle = index * self.step
+        if smooth or scale != 1:
+            return pygame.transform.rotozoom(image, angle, scale)
+        return pygame.transform.rotate(image, angle)
+
+    # store a frame and evict the least recently used frames over the memory cap
+    def store(self, key, frame):
+        size = frame.get_width() * frame.get_height() * frame.get_bytesize()
+        if size > self.max_bytes:
+            return
+
+        self.frames[key] = frame
+        self.used_bytes += size
+        while self.used_bytes > self.max_bytes:
+            _, old = self.frames.popitem(last=False)
+            self.used_bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+
+    # return a named image rotated counter-clockwise by angle degrees
+    def get(self, name, angle):
+        key = (name, self.index(angle))
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.hits += 1
+            self.frames.move_to_end(key)
+            return frame
+
+        self.misses += 1
+        frame = self.render(name, key[1])
+        self.store(key, frame)
+        return frame
+
+    # render every frame of the named images, or of all images, up front
+    def build(self, names=None):
+        for name in names or list(self.images):
+            for index in range(self.frame_count):
+                key = (name, index)
+                if key not in self.frames:
+                    self.store(key, self.render(name, index))
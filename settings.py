@@ -3,6 +3,10 @@
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1080
 FPS = 60
+TICK_RATE = 60
+MAX_TICKS_PER_FRAME = 5
+GAME_SEED = None
+FAST_STARTUP = True
 
 # player setup
 
@@ -24,11 +28,32 @@ SHOOT_COOLDOWN = 6
 BULLET_SIZE = 0.2
 BULLET_SPEED = 50
 BULLET_LIFETIME = 1000
+BULLET_LIFETIME_TICKS = BULLET_LIFETIME * TICK_RATE // 1000
 BULLET_SPREAD = 10
 DROP_WEAPON_SIZE = 0.5
 DROP_CHANCE = 30
 AMMO_COUNT = 24
 
+# bullet engine setup
+
+USE_BULLET_ENGINE = False
+BULLET_ENGINE_CAPACITY = 10000
+
+# pool setup
+
+# bullets and dropped weapons kept for reuse, and what a pool does once that many are in play:
+# "grow" makes more anyway, "recycle" reuses the oldest one in play and "drop" loses the shot or the drop
+BULLET_POOL_CAPACITY = 512
+BULLET_POOL_OVERFLOW = "grow"
+DROP_POOL_CAPACITY = 256
+DROP_POOL_OVERFLOW = "grow"
+
+# rotation cache setup
+
+ROTATION_STEP = 2
+ROTATION_CACHE_MAX_MB = 64
+ROTATION_CACHE_LAZY = True
+
 # enemy setup
 
 ENEMY_SIZE = 0.42
@@ -38,6 +63,18 @@ ENEMY_SHOOT_COOLDOWN = 6
 ENEMY_REACTION_TIME = 20
 ENEMY_GUN_OFFSET_X = 40
 ENEMY_GUN_OFFSET_Y = 25
+ENEMY_CHASE = False
+
+# asset setup
+
+ASSET_CACHE_PATH = "assets.atlas"
+ASSET_ATLAS_WIDTH = 2048
+ASSET_ATLAS_ROTATIONS = ("bullet",)
+ASSET_DECODE_THREADS = 4
+
+# text setup
+
+TEXT_CACHE_SIZE = 64
 
 # colours
 BLACK = (0, 0, 0)
@@ -47,7 +84,49 @@ GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
 # map setup
+MAP_FILENAME = "map1.txt"
 TILE_SIZE = 64
+CHUNK_SIZE = 8
+MAX_CACHED_CHUNKS = 48
+BAKE_CORPSES = True
+BAKE_DROPS = True
+VISIBILITY_INDEX = True
+VISIBILITY_CACHE = True
+VISIBILITY_MAX_TILES = 3600
+VISIBILITY_EDGE_MARGIN = 2
+MAP_COMPILE = True
+COMPILED_MAP_SUFFIX = ".cmap"
+STREAMED_MAP_SUFFIX = ".smap"
+STREAM_MAP_MIN_BYTES = 4 * 1024 * 1024
+STREAM_BLOCK_TILES = 256
+STREAM_RADIUS_BLOCKS = 1
+
+# leaderboard setup
+LEADERBOARD_PATH = "times.db"
+LEGACY_TIMES_PATH = "times.txt"
+
+# replay setup
+RECORD_REPLAYS = True
+REPLAY_DIR = "replays"
+REPLAY_CHECKSUM_INTERVAL = 60
+
+# benchmark setup
+BENCHMARK_TICKS = 600
+BENCHMARK_SEED = 1
+BENCHMARK_MAP_DIR = "bench_maps"
+BENCHMARK_OUTPUT = "benchmark_results.json"
+BENCHMARK_BASELINE = "benchmark_baseline.json"
+BENCHMARK_THRESHOLD = 0.15
+
+# profiler setup
+PROFILER_HISTORY = 240
+PROFILER_MAX_EVENTS = 200000
+PROFILER_TRACE_PATH = "trace.json"
+
+# batch setup
+BATCH_RUNS = 100
+BATCH_MAX_TICKS = 7200
+BATCH_OUTPUT = "batch_results.jsonl"
 
 # menu setup
 BUTTON_WIDTH = 200
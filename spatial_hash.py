@@ -0,0 +1,71 @@
+# importing modules
+from settings import *
+
+# uniform grid spatial hash used as a collision broadphase
+class SpatialHash:
+    def __init__(self, cell_size=TILE_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+
+        # candidate pairs tested this frame and last frame
+        self.pairs_tested = 0
+        self.last_pairs_tested = 0
+
+    # return the cell keys covered by a rect
+    def cells_for_rect(self, rect):
+        x0 = rect.left // self.cell_size
+        y0 = rect.top // self.cell_size
+        x1 = (rect.right - 1) // self.cell_size
+        y1 = (rect.bottom - 1) // self.cell_size
+        return [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+    # add a sprite to every cell its rect overlaps
+    def insert(self, sprite):
+        keys = self.cells_for_rect(sprite.rect)
+        self.sprite_cells[sprite] = keys
+        for key in keys:
+            self.cells.setdefault(key, set()).add(sprite)
+
+    # remove a sprite from the hash
+    def remove(self, sprite):
+        keys = self.sprite_cells.pop(sprite, None)
+        if keys is None:
+            return
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell is not None:
+                cell.discard(sprite)
+                if not cell:
+                    del self.cells[key]
+
+    # move a sprite to the cells matching its current rect
+    def update(self, sprite):
+        keys = self.cells_for_rect(sprite.rect)
+        if self.sprite_cells.get(sprite) != keys:
+            self.remove(sprite)
+            self.insert(sprite)
+
+    # clear the hash and insert sprites again, starting a new frame count
+    def rebuild(self, sprites):
+        self.cells.clear()
+        self.sprite_cells.clear()
+        self.last_pairs_tested = self.pairs_tested
+        self.pairs_tested = 0
+        for sprite in sprites:
+            self.insert(sprite)
+
+    # return sprites whose rect overlaps the given rect
+    def query(self, rect):
+        found = set()
+        for key in self.cells_for_rect(rect):
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+
+        results = []
+        for sprite in found:
+            self.pairs_tested += 1
+            if rect.colliderect(sprite.rect):
+                results.append(sprite)
+        return results
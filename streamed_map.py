@@ -0,0 +1,259 @@
+# importing modules
+import os
+import sys
+import mmap
+import time
+import random
+import struct
+import argparse
+from settings import *
+from map_compiler import file_hash
+
+# numpy is optional, it answers batches of wall queries straight from the mapped file
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# file layout: header padded to a page, the wall bitmap in square blocks each padded to whole pages, then spawn and exit tables as int32 tile pairs
+# tiles of a block are stored row by row, most significant bit first, so a region of the map is a few pages of the file
+STREAMED_MAGIC = b"SMP1"
+STREAMED_VERSION = 1
+HEADER = struct.Struct("<4sHIIH20sIIIii")
+TILE_PAIR = struct.Struct("<ii")
+
+# one page for the header keeps the blocks page aligned
+DATA_OFFSET = mmap.ALLOCATIONGRANULARITY
+
+# every byte of a text row mapped to 1 for walls and 0 for anything else
+WALL_BITS = bytes(ord("1") if byte in b"#X" else ord("0") for byte in range(256))
+
+# bytes between the starts of two blocks
+def block_stride(block_tiles):
+    block_bytes = block_tiles * block_tiles // 8
+    return (block_bytes + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+# write a streamed map from rows of wall bits, each row an int with the first tile in the highest bit
+# only one row of blocks is held in memory at a time
+# spawn and exit lists may still be filling while the rows are read, the last exit tile is the level exit
+def write_streamed_map(path, width, height, wall_rows, enemy_spawns, player_spawns, exit_tiles, source_hash=b"", block_tiles=STREAM_BLOCK_TILES):
+    if block_tiles % 8:
+        raise ValueError("block size must be a multiple of 8 tiles")
+    blocks_x = (width + block_tiles - 1) // block_tiles
+    padded_width = blocks_x * block_tiles
+    row_bytes = block_tiles // 8
+    stride = block_stride(block_tiles)
+    padding = bytes(stride - row_bytes * block_tiles)
+
+    with open(path, "wb") as f:
+        f.seek(DATA_OFFSET)
+        rows = iter(wall_rows)
+        for first_row in range(0, height, block_tiles):
+            # one bytearray per block of this block row
+            blocks = [bytearray() for _ in range(blocks_x)]
+            for y in range(first_row, first_row + block_tiles):
+                bits = next(rows, 0) if y < height else 0
+                packed = (bits << (padded_width - width)).to_bytes(padded_width // 8, "big")
+                for block_x in range(blocks_x):
+                    blocks[block_x] += packed[block_x * row_bytes:(block_x + 1) * row_bytes]
+            for block in blocks:
+                f.write(block)
+                f.write(padding)
+
+        for table in (enemy_spawns, player_spawns, exit_tiles):
+            for x, y in table:
+                f.write(TILE_PAIR.pack(x, y))
+
+        exit_x, exit_y = exit_tiles[-1] if exit_tiles else (-1, -1)
+        f.seek(0)
+        f.write(HEADER.pack(STREAMED_MAGIC, STREAMED_VERSION, width, height, block_tiles, source_hash,
+                            len(enemy_spawns), len(player_spawns), len(exit_tiles), exit_x, exit_y))
+
+# convert a text map a line at a time, with the same rules as the text loader
+# a row ends at its first exit tile and rows that end early are floor past their end
+def convert_text_map(text_path, out_path, source_hash=None, block_tiles=STREAM_BLOCK_TILES):
+    with open(text_path, "rb") as f:
+        width = len(f.readline().strip())
+        f.seek(0)
+        height = sum(1 for _ in f)
+
+    enemy_spawns = []
+    player_spawns = []
+    exit_tiles = []
+
+    def wall_rows(f):
+        for y, line in enumerate(f):
+            line = line.strip()
+            exit_x = line.find(b"X")
+            if exit_x >= 0:
+                line = line[:exit_x + 1]
+                exit_tiles.append((exit_x, y))
+            for symbol, spawns in ((b"E", enemy_spawns), (b"P", player_spawns)):
+                x = line.find(symbol)
+                while x >= 0:
+                    spawns.append((x, y))
+                    x = line.find(symbol, x + 1)
+
+            line = line[:width].ljust(width, b" ")
+            yield int(line.translate(WALL_BITS), 2) if width else 0
+
+    with open(text_path, "rb") as f:
+        write_streamed_map(out_path, width, height, wall_rows(f), enemy_spawns, player_spawns, exit_tiles,
+                           source_hash or file_hash(text_path), block_tiles)
+
+# an open level for streaming tests, walled at the edges with pillars scattered across it
+def generate_open_map(path, size, enemy_count, seed=0, pillar_chance=0.002, block_tiles=STREAM_BLOCK_TILES):
+    rng = random.Random(seed)
+    edge = 1 << (size - 1) | 1
+
+    def wall_rows():
+        for y in range(size):
+            if y == 0 or y == size - 1:
+                yield (1 << size) - 1
+                continue
+            bits = edge
+            for _ in range(int(size * pillar_chance)):
+                bits |= 1 << rng.randrange(1, size - 1)
+            yield bits
+
+    centre = size // 2
+    enemy_spawns = [(centre + rng.randint(-60, 60), centre + rng.randint(-60, 60)) for _ in range(enemy_count)]
+    write_streamed_map(path, size, size, wall_rows(), enemy_spawns, [(centre, centre)], [(size - 2, size - 1)], b"", block_tiles)
+
+# walls of a map read from a memory mapped file, only the blocks around the things that move are kept resident
+class StreamedMap:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.width, self.height, self.block_tiles, self.source_hash,
+         enemy_count, player_count, exit_count, exit_x, exit_y) = HEADER.unpack_from(self.data)
+        if magic != STREAMED_MAGIC or version != STREAMED_VERSION:
+            raise ValueError("{} is not a version {} streamed map".format(path, STREAMED_VERSION))
+
+        self.blocks_x = (self.width + self.block_tiles - 1) // self.block_tiles
+        self.blocks_y = (self.height + self.block_tiles - 1) // self.block_tiles
+        self.row_bytes = self.block_tiles // 8
+        self.stride = block_stride(self.block_tiles)
+
+        offset = DATA_OFFSET + self.blocks_x * self.blocks_y * self.stride
+        tables = []
+        for count in (enemy_count, player_count, exit_count):
+            tables.append([TILE_PAIR.unpack_from(self.data, offset + i * TILE_PAIR.size) for i in range(count)])
+            offset += count * TILE_PAIR.size
+        self.enemy_spawns, self.player_spawns, self.exit_tiles = tables
+        self.exit_tile = (exit_x, exit_y) if exit_x >= 0 else None
+
+        # blocks asked to stay resident, and how often blocks were paged in and out
+        self.resident = set()
+        self.focus = None
+        self.pages_in = 0
+        self.pages_out = 0
+
+        # the bitmap as bytes for batched lookups, a view of the mapping rather than a copy
+        self.bitmap = np.frombuffer(self.data, dtype=np.uint8) if np is not None else None
+
+    # check if a tile index is a wall, anything outside the map is floor
+    def is_wall_tile(self, tile_x, tile_y):
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            block_tiles = self.block_tiles
+            block_x, x = divmod(tile_x, block_tiles)
+            block_y, y = divmod(tile_y, block_tiles)
+            byte = self.data[DATA_OFFSET + (block_y * self.blocks_x + block_x) * self.stride + y * self.row_bytes + (x >> 3)]
+            return bool(byte >> (7 - (x & 7)) & 1)
+        return False
+
+    # check many tile indices at once, returns a boolean array
+    def is_wall_tiles(self, tile_x, tile_y):
+        inside = (tile_x >= 0) & (tile_x < self.width) & (tile_y >= 0) & (tile_y < self.height)
+        x = tile_x[inside]
+        y = tile_y[inside]
+        block_tiles = self.block_tiles
+        offset = DATA_OFFSET + ((y // block_tiles) * self.blocks_x + x // block_tiles) * self.stride + (y % block_tiles) * self.row_bytes + (x % block_tiles >> 3)
+        walls = np.zeros(len(tile_x), dtype=bool)
+        walls[inside] = (self.bitmap[offset] >> (7 - (x & 7))) & 1
+        return walls
+
+    # keep the blocks around some positions resident and let the rest go
+    # positions are in pixels, blocks within STREAM_RADIUS_BLOCKS of any of them are read ahead
+    def stream(self, positions):
+        block_pixels = self.block_tiles * TILE_SIZE
+        focus = {(int(x // block_pixels), int(y // block_pixels)) for x, y in positions}
+        if focus == self.focus:
+            return
+        self.focus = focus
+
+        radius = STREAM_RADIUS_BLOCKS
+        wanted = {(block_x, block_y)
+                  for focus_x, focus_y in focus
+                  for block_y in range(max(0, focus_y - radius), min(self.blocks_y, focus_y + radius + 1))
+                  for block_x in range(max(0, focus_x - radius), min(self.blocks_x, focus_x + radius + 1))}
+        for block in wanted - self.resident:
+            self.advise(block, mmap.MADV_WILLNEED)
+            self.pages_in += 1
+        for block in self.resident - wanted:
+            self.advise(block, mmap.MADV_DONTNEED)
+            self.pages_out += 1
+        self.resident = wanted
+
+    # pass paging advice for one block to the operating system, where it takes any
+    def advise(self, block, option):
+        if hasattr(self.data, "madvise"):
+            self.data.madvise(option, DATA_OFFSET + (block[1] * self.blocks_x + block[0]) * self.stride, self.stride)
+
+    # describe the map size and how much of it is resident
+    def report(self):
+        return "streamed map: {}x{} tiles in {} blocks, {} resident ({:.1f} MiB of {:.1f} MiB), {} paged in, {} paged out".format(
+            self.width, self.height, self.blocks_x * self.blocks_y, len(self.resident), len(self.resident) * self.stride / (1024 * 1024),
+            len(self.data) / (1024 * 1024), self.pages_in, self.pages_out)
+
+    # unmap the file
+    def close(self):
+        self.bitmap = None
+        self.data.close()
+        self.file.close()
+
+# check if a map should be streamed, streamed files always are and text maps are once they are large
+def is_streamed(map_filename):
+    return map_filename.endswith(STREAMED_MAP_SUFFIX) or os.path.getsize(map_filename) > STREAM_MAP_MIN_BYTES
+
+# open a map for streaming, converting a text map beside its source when the converted copy is missing or stale
+def load_streamed(map_filename):
+    if map_filename.endswith(STREAMED_MAP_SUFFIX):
+        return StreamedMap(map_filename)
+
+    source_hash = file_hash(map_filename)
+    streamed_path = map_filename + STREAMED_MAP_SUFFIX
+    try:
+        level = StreamedMap(streamed_path)
+        if level.source_hash == source_hash:
+            return level
+        level.close()
+    except (OSError, ValueError, struct.error):
+        pass
+
+    convert_text_map(map_filename, streamed_path, source_hash)
+    return StreamedMap(streamed_path)
+
+# convert maps or generate a large test level from the command line
+def main():
+    parser = argparse.ArgumentParser(description="convert text maps into memory mapped streamed maps")
+    parser.add_argument("maps", nargs="*")
+    parser.add_argument("--generate", type=int, metavar="SIZE", help="write an open SIZE by SIZE test level instead")
+    parser.add_argument("--enemies", type=int, default=200, help="enemies in a generated level")
+    parser.add_argument("--output", default="open" + STREAMED_MAP_SUFFIX, help="where to write a generated level")
+    args = parser.parse_args()
+
+    if args.generate:
+        start = time.perf_counter()
+        generate_open_map(args.output, args.generate, args.enemies)
+        print("{}: {}x{} tiles in {:.1f}s".format(args.output, args.generate, args.generate, time.perf_counter() - start))
+    for map_filename in args.maps:
+        start = time.perf_counter()
+        level = load_streamed(map_filename)
+        print("{} in {:.1f}s".format(level.report(), time.perf_counter() - start))
+        level.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# importing modules
+import math
+
+# numpy is optional, only the batched test needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# return how far along a segment it first enters a box, as a fraction from 0 to 1, or None if it misses
+# the box is left, top, right, bottom and a segment starting inside it hits at 0
+def segment_box_time(start_x, start_y, delta_x, delta_y, box):
+    left, top, right, bottom = box
+    t_enter = 0.0
+    t_exit = 1.0
+    for start, delta, low, high in ((start_x, delta_x, left, right), (start_y, delta_y, top, bottom)):
+        if delta == 0:
+            if not low < start < high:
+                return None
+            continue
+        t_low = (low - start) / delta
+        t_high = (high - start) / delta
+        if t_low > t_high:
+            t_low, t_high = t_high, t_low
+        t_enter = max(t_enter, t_low)
+        t_exit = min(t_exit, t_high)
+        if t_enter >= t_exit:
+            return None
+    return t_enter
+
+# the same test for many segments against one box, boxes are grown by each segment's half size
+# returns the entry fraction for every segment, infinity where it misses
+def segment_box_times(start_x, start_y, delta_x, delta_y, box, half_width, half_height):
+    left, top, right, bottom = box
+    t_enter = np.zeros(len(start_x))
+    t_exit = np.ones(len(start_x))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start, delta, low, high in ((start_x, delta_x, left - half_width, right + half_width), (start_y, delta_y, top - half_height, bottom + half_height)):
+            t_low = (low - start) / delta
+            t_high = (high - start) / delta
+
+            # segments that do not move on this axis are inside the slab for all of it or none of it
+            still = delta == 0
+            inside = (low < start) & (start < high)
+            t_low = np.where(still, np.where(inside, -math.inf, math.inf), t_low)
+            t_high = np.where(still, math.inf, t_high)
+
+            t_enter = np.maximum(t_enter, np.minimum(t_low, t_high))
+            t_exit = np.minimum(t_exit, np.maximum(t_low, t_high))
+    return np.where(t_enter < t_exit, t_enter, math.inf)
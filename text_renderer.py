@@ -0,0 +1,87 @@
+# importing modules
+import pygame
+from collections import OrderedDict
+from settings import *
+
+# characters pre-rendered for the timer and counters
+GLYPH_CHARACTERS = "0123456789."
+
+# offsets of the black outline drawn behind white text
+OUTLINE_OFFSETS = [(-1, -1), (1, -1), (-1, 1), (1, 1)]
+
+# cached fonts, outlined strings and outlined glyphs for the HUD
+class TextRenderer:
+    def __init__(self, cache_size=TEXT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.fonts = {}
+        self.outlined = OrderedDict()
+        self.glyphs = {}
+
+    # return a cached font for a size
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.SysFont(None, size)
+            self.fonts[size] = font
+        return font
+
+    # render white text with a one pixel black outline onto a transparent surface
+    def render_outlined(self, size, content):
+        font = self.font(size)
+        outline = font.render(content, True, BLACK)
+        surface = pygame.Surface((outline.get_width() + 2, outline.get_height() + 2), pygame.SRCALPHA)
+        for offset in OUTLINE_OFFSETS:
+            surface.blit(outline, (1 + offset[0], 1 + offset[1]))
+        surface.blit(font.render(content, True, WHITE), (1, 1))
+        return surface
+
+    # return an outlined string from the least recently used cache
+    def outlined_text(self, size, content):
+        key = (size, content)
+        surface = self.outlined.get(key)
+        if surface is not None:
+            self.outlined.move_to_end(key)
+            return surface
+
+        surface = self.render_outlined(size, content)
+        self.outlined[key] = surface
+        if len(self.outlined) > self.cache_size:
+            self.outlined.popitem(last=False)
+        return surface
+
+    # return the glyph atlas for a size, with the spacing adjustment for each pair of glyphs
+    def glyph_atlas(self, size):
+        atlas = self.glyphs.get(size)
+        if atlas is None:
+            font = self.font(size)
+            glyphs = {char: self.render_outlined(size, char) for char in GLYPH_CHARACTERS}
+            widths = {char: font.size(char)[0] for char in GLYPH_CHARACTERS}
+            kerning = {(a, b): font.size(a + b)[0] - widths[a] - widths[b] for a in GLYPH_CHARACTERS for b in GLYPH_CHARACTERS}
+            atlas = (glyphs, kerning)
+            self.glyphs[size] = atlas
+        return atlas
+
+    # draw outlined text centred on a point
+    def draw_outlined(self, surface, size, content, x, y):
+        text_surface = self.outlined_text(size, content)
+        surface.blit(text_surface, text_surface.get_rect(center=(x, y)))
+
+    # draw outlined text centred on a point, composed from cached glyphs
+    def draw_glyphs(self, surface, size, content, x, y):
+        glyphs, kerning = self.glyph_atlas(size)
+        if not content or any(char not in glyphs for char in content):
+            self.draw_outlined(surface, size, content, x, y)
+            return
+
+        # place each glyph where the font would, glyphs overlap by their two pixel outline padding
+        positions = [0]
+        for previous, char in zip(content, content[1:]):
+            positions.append(positions[-1] + glyphs[previous].get_width() - 2 + kerning[previous, char])
+        width = positions[-1] + glyphs[content[-1]].get_width()
+        height = glyphs[content[0]].get_height()
+
+        # match the rounding of a rect centred on the whole string
+        text_rect = pygame.Rect(0, 0, width, height)
+        text_rect.center = (x, y)
+        for char, position in zip(content, positions):
+            surface.blit(glyphs[char], (text_rect.x + position, text_rect.y))
@@ -0,0 +1,237 @@
+# importing modules
+import os
+import json
+import time
+import hashlib
+import tracemalloc
+from settings import *
+from map_compiler import file_hash
+
+# numpy is optional, line of sight falls back to ray checks without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# bumped whenever the line of sight or shadow edge rules change, so cached indexes are built again
+VISIBILITY_VERSION = 1
+
+# 8 neighbouring tile offsets used to find shadow edges
+NEIGHBOUR_OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+# potentially visible set between floor tiles, stored as one packed bitset row per floor tile
+class VisibilityIndex:
+    def __init__(self, floor_ids, visible, boundary, key="", build_time=0.0, from_cache=False, peak_bytes=0):
+        self.floor_ids = floor_ids
+        self.visible = visible
+        self.boundary = boundary
+        self.key = key
+        self.build_time = build_time
+        self.from_cache = from_cache
+        self.peak_bytes = peak_bytes
+        self.height, self.width = floor_ids.shape
+
+    # memory used by the index in bytes
+    @property
+    def nbytes(self):
+        return self.floor_ids.nbytes + self.visible.nbytes + self.boundary.nbytes
+
+    # describe where the index came from, how long that took and its memory use, with the peak memory of a build
+    def report(self):
+        if self.from_cache:
+            return "visibility index: {} floor tiles, loaded in {:.2f}s, {:.1f} KiB".format(len(self.visible), self.build_time, self.nbytes / 1024)
+        return "visibility index: {} floor tiles, built in {:.2f}s, {:.1f} KiB, peak {:.1f} MiB".format(
+            len(self.visible), self.build_time, self.nbytes / 1024, self.peak_bytes / (1024 * 1024))
+
+    # return True or False for tile pairs known from the index, None when a ray check is needed
+    def lookup(self, tile_a, tile_b):
+        ax, ay = tile_a
+        bx, by = tile_b
+        if not (0 <= ax < self.width and 0 <= ay < self.height and 0 <= bx < self.width and 0 <= by < self.height):
+            return None
+
+        a = self.floor_ids[ay, ax]
+        b = self.floor_ids[by, bx]
+        if a < 0 or b < 0:
+            return None
+
+        byte = b >> 3
+        bit = 7 - (b & 7)
+        if (self.boundary[a, byte] >> bit) & 1:
+            return None
+        return bool((self.visible[a, byte] >> bit) & 1)
+
+    # build the index from rows of wall flags, keeping every full table packed and only a band of rows unpacked at a time
+    @classmethod
+    def build(cls, wall_rows, key=""):
+        start = time.perf_counter()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        walls = np.array(wall_rows, dtype=bool)
+        height, width = walls.shape
+
+        # number the floor tiles
+        floor_ids = np.full((height, width), -1, dtype=np.int32)
+        floor_y, floor_x = np.nonzero(~walls)
+        floor_count = len(floor_x)
+        floor_ids[floor_y, floor_x] = np.arange(floor_count, dtype=np.int32)
+
+        visible = centre_visibility(walls, floor_x, floor_y)
+
+        # tile pairs on a shadow edge may differ between points inside the tiles
+        padded_ids = np.full((height + 2, width + 2), -1, dtype=np.int32)
+        padded_ids[1:-1, 1:-1] = floor_ids
+        neighbours = [padded_ids[floor_y + 1 + dy, floor_x + 1 + dx] for dx, dy in NEIGHBOUR_OFFSETS]
+        boundary = spread_rows(visible, neighbours, lambda rows, shifted: rows != shifted)
+
+        # widen the shadow edges so corner grazing rays near them are also checked exactly
+        for _ in range(VISIBILITY_EDGE_MARGIN):
+            boundary = spread_rows(boundary, neighbours, lambda rows, shifted: shifted, keep=True)
+
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+        return cls(floor_ids, visible, boundary, key, time.perf_counter() - start, peak_bytes=peak_bytes)
+
+    # save the index next to its map
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez_compressed(f, floor_ids=self.floor_ids, visible=self.visible, boundary=self.boundary, key=np.array(self.key))
+
+    # load a saved index, returns None if it is missing or was built from a different map or with different settings
+    @classmethod
+    def load(cls, path, key):
+        start = time.perf_counter()
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != key:
+                    return None
+                return cls(data["floor_ids"], data["visible"], data["boundary"], key, time.perf_counter() - start, from_cache=True)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # load the cached index for a map file or build and cache a new one
+    @classmethod
+    def for_map(cls, map_filename, wall_rows):
+        key = index_key(map_filename)
+        cache_path = map_filename + ".pvs.npz"
+        if VISIBILITY_CACHE and os.path.exists(cache_path):
+            index = cls.load(cache_path, key)
+            if index is not None:
+                return index
+
+        index = cls.build(wall_rows, key)
+        if VISIBILITY_CACHE:
+            try:
+                index.save(cache_path)
+            except OSError:
+                pass
+        return index
+
+# sha1 of everything an index is built from, any change to the map, the edge margin or the build rules builds it again
+def index_key(map_filename):
+    digest = hashlib.sha1()
+    digest.update(json.dumps([VISIBILITY_VERSION, VISIBILITY_EDGE_MARGIN]).encode("utf-8"))
+    digest.update(file_hash(map_filename))
+    return digest.hexdigest()
+
+# centre to centre visibility between every pair of floor tiles as packed rows
+# rays are only walked from each tile to the tiles after it, a batch of rays at a time, then the rows are mirrored
+def centre_visibility(walls, floor_x, floor_y, batch_size=1 << 18):
+    floor_count = len(floor_x)
+    visible = np.zeros((floor_count, (floor_count + 7) // 8), dtype=np.uint8)
+
+    first = 0
+    while first < floor_count:
+        # as many source rows as fit their rays in one batch
+        last = first + 1
+        pair_count = floor_count - last
+        while last < floor_count and pair_count + floor_count - last - 1 <= batch_size:
+            last += 1
+            pair_count += floor_count - last
+
+        sources = np.arange(first, last)
+        counts = floor_count - 1 - sources
+        a = np.repeat(sources, counts)
+        b = a + 1 + np.arange(len(a)) - np.repeat(np.cumsum(counts) - counts, counts)
+        clear = trace_rays(walls, floor_x, floor_y, a, b)
+
+        rows = np.zeros((last - first, floor_count), dtype=bool)
+        rows[a[clear] - first, b[clear]] = True
+        rows[sources - first, sources] = True
+        visible[first:last] = np.packbits(rows, axis=1)
+        first = last
+
+    # the bits before the diagonal of a row are its column in the earlier rows, bands start on whole bytes
+    band = max(8, batch_size // max(floor_count, 1) // 8 * 8)
+    for first in range(0, floor_count, band):
+        last = min(first + band, floor_count)
+        columns = np.unpackbits(visible[:last, first // 8:(last + 7) // 8], axis=1, count=last - first)
+        rows = np.unpackbits(visible[first:last], axis=1, count=floor_count)
+        rows[:, :last] |= columns.T
+        visible[first:last] = np.packbits(rows, axis=1)
+    return visible
+
+# whether each ray from the centre of floor tile a to the centre of floor tile b misses every wall, walking the tiles on all rays at once
+def trace_rays(walls, floor_x, floor_y, a, b):
+    x = floor_x[a].astype(np.int32)
+    y = floor_y[a].astype(np.int32)
+    delta_x = (floor_x[b] - floor_x[a]).astype(np.float64)
+    delta_y = (floor_y[b] - floor_y[a]).astype(np.float64)
+    step_x = np.sign(delta_x).astype(np.int32)
+    step_y = np.sign(delta_y).astype(np.int32)
+
+    # ray parameter at the next tile edge, rays start at tile centres so the first edge is half a tile away
+    with np.errstate(divide="ignore"):
+        t_delta_x = 1 / np.abs(delta_x)
+        t_delta_y = 1 / np.abs(delta_y)
+    t_max_x = t_delta_x / 2
+    t_max_y = t_delta_y / 2
+    remaining = np.abs(delta_x).astype(np.int32) + np.abs(delta_y).astype(np.int32)
+
+    # walk the rays until they reach the target or a wall, dropping finished rays from the arrays as they go
+    # passing exactly through a corner steps diagonally
+    ray = np.arange(len(a))
+    clear = np.ones(len(a), dtype=bool)
+    while len(ray):
+        move_x = t_max_x <= t_max_y
+        move_y = t_max_y <= t_max_x
+        x += step_x * move_x
+        y += step_y * move_y
+        np.add(t_max_x, t_delta_x, out=t_max_x, where=move_x)
+        np.add(t_max_y, t_delta_y, out=t_max_y, where=move_y)
+        remaining -= move_x.astype(np.int32) + move_y
+
+        blocked = walls[y, x]
+        clear[ray[blocked]] = False
+        keep = ~blocked & (remaining > 0)
+        if not keep.all():
+            ray, x, y, step_x, step_y, t_max_x, t_max_y, t_delta_x, t_delta_y, remaining = (
+                array[keep] for array in (ray, x, y, step_x, step_y, t_max_x, t_max_y, t_delta_x, t_delta_y, remaining))
+    return clear
+
+# a symmetric packed table marking pairs where mark(row, row of a neighbour) holds for a neighbour of either tile
+# keep also marks every pair already set, rows are unpacked a band at a time
+def spread_rows(table, neighbours, mark, keep=False, band_size=256):
+    floor_count = len(table)
+    spread = np.empty_like(table)
+    for first in range(0, floor_count, band_size):
+        last = min(first + band_size, floor_count)
+        rows = np.unpackbits(table[first:last], axis=1, count=floor_count).astype(bool)
+        marked = rows.copy() if keep else np.zeros_like(rows)
+
+        for neighbour in neighbours:
+            # neighbours of the target tile, along the rows
+            has_neighbour = neighbour >= 0
+            marked[:, has_neighbour] |= mark(rows[:, has_neighbour], rows[:, neighbour[has_neighbour]])
+
+            # neighbours of the source tile, the rows of those tiles
+            has_neighbour = neighbour[first:last] >= 0
+            shifted = np.unpackbits(table[neighbour[first:last][has_neighbour]], axis=1, count=floor_count).astype(bool)
+            marked[has_neighbour] |= mark(rows[has_neighbour], shifted)
+
+        spread[first:last] = np.packbits(marked, axis=1)
+    return spread